@@ -28,7 +28,52 @@ API_WORKERS = int(os.getenv("API_WORKERS", "2"))
 # LLM settings
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 LLM_MODEL_LARGE = os.getenv("LLM_MODEL_LARGE", "gpt-4o")
+LLM_MODEL_ROUTER = os.getenv("LLM_MODEL_ROUTER", "gpt-4o-mini")  # Clasificación/extracción: modelo pequeño y determinista
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")  # SQLite persistente de embeddings
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "4096"))
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "7"))  # Mensajes recientes que se envían al LLM
+STATE_MAX_MESSAGES = int(os.getenv("STATE_MAX_MESSAGES", "20"))  # Por encima, los más antiguos pasan al store
+STATE_KEEP_MESSAGES = int(os.getenv("STATE_KEEP_MESSAGES", "10"))  # Mensajes recientes que quedan en el estado
+
+# Semantic response cache settings
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "16"))  # per business + history partition
+SEMANTIC_CACHE_MAX_PARTITIONS = int(os.getenv("SEMANTIC_CACHE_MAX_PARTITIONS", "256"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # seconds
+
+# Web search (Tavily) cache settings
+SEARCH_RESULTS_CACHE_TTL = int(os.getenv("SEARCH_RESULTS_CACHE_TTL", "86400"))  # seconds
+SEARCH_RESULTS_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_RESULTS_CACHE_MAX_ENTRIES", "1024"))
+
+# Document search cache settings
+DOCUMENT_SEARCH_CACHE_TTL = int(os.getenv("DOCUMENT_SEARCH_CACHE_TTL", "300"))  # seconds
+DOCUMENT_SEARCH_CACHE_THRESHOLD = float(os.getenv("DOCUMENT_SEARCH_CACHE_THRESHOLD", "0.95"))
+DOCUMENT_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("DOCUMENT_SEARCH_CACHE_MAX_ENTRIES", "500"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))  # 1 desactiva el micro-batching
+EMBEDDING_BATCH_WAIT = float(os.getenv("EMBEDDING_BATCH_WAIT", "0.02"))  # seconds
+
+# Business info extraction memoization
+EXTRACTION_CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", "300"))  # seconds
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "1024"))
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "8.0"))  # seconds
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "16"))
+RESEARCH_CACHE_TTL = int(os.getenv("RESEARCH_CACHE_TTL", "3600"))  # seconds
+# Search the fallback queries while the LLM writes its own ones (opt-in: when the
+# queries differ, up to 3 paid searches are cancelled after being sent)
+RESEARCH_SPECULATIVE_SEARCH = os.getenv("RESEARCH_SPECULATIVE_SEARCH", "false").lower() == "true"
+# Run the whole research while the user validates their business info (opt-in: if the
+# user corrects the info, the paid searches and LLM calls already made are wasted)
+RESEARCH_SPECULATIVE_PREFETCH = os.getenv("RESEARCH_SPECULATIVE_PREFETCH", "false").lower() == "true"
+# Research analysis prompt budget
+RESEARCH_RESULT_MAX_CHARS = int(os.getenv("RESEARCH_RESULT_MAX_CHARS", "1200"))  # per search result
+RESEARCH_TEXT_MAX_CHARS = int(os.getenv("RESEARCH_TEXT_MAX_CHARS", "15000"))  # whole research text
+
+# Persistent LLM response cache (research prompts)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))  # seconds
 
 #VECTOR STORE
 QDRANT_URL = os.getenv("QDRANT_URL", "https://your-qdrant-url")  # Reemplázalo con tu URL real
@@ -111,12 +111,15 @@ async def get_async_connection_pool() -> AsyncConnectionPool:
 
     if _async_connection_pool is None:
         try:
-            # Create async connection pool
-            _async_connection_pool = AsyncConnectionPool(
+            # Create async connection pool (opened explicitly: opening in the constructor is deprecated)
+            pool = AsyncConnectionPool(
                 conninfo=postgresql_connection_string,
                 max_size=DB_POOL_SIZE,
                 kwargs=connection_kwargs,
+                open=False,
             )
+            await pool.open()
+            _async_connection_pool = pool
 
             logger.info("Async PostgreSQL connection pool initialized")
         except Exception as e:
@@ -1,18 +1,31 @@
 import logging
-from typing import Dict, Any, List, Optional
+import re
+from typing import Dict, Any, List
 from datetime import datetime
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from functools import lru_cache
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
+from langgraph.errors import GraphInterrupt
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import interrupt, Command
-from pydantic import BaseModel, Field
 
-from app.config.settings import LLM_MODEL
-from app.graph.state import PYMESState, BusinessInfo
+from app.config.settings import LLM_MODEL, RESEARCH_SPECULATIVE_PREFETCH
+from app.graph.research_subgraph import discard_speculative_research, start_speculative_research
+from app.graph.state import PYMESState, human_message_update
+from app.utils.serialization import stable_json
 
 logger = logging.getLogger(__name__)
 
+# Pistas de que una línea contiene el nombre de la empresa
+_COMPANY_NAME_HINT_RE = re.compile(r"empresa|negocio|llam[oa]", re.IGNORECASE)
+
+# Respuestas a la validación: confirmación exacta, o petición de corregir/agregar en cualquier parte
+_VALIDATION_RE = re.compile(
+    r"^(?P<confirm>sí|si|yes|correcto|ok|está bien)$|(?P<change>corregir|cambiar|agregar)",
+    re.IGNORECASE
+)
+
 # Prompts para la extracción de información
 BUSINESS_INFO_EXTRACTION_PROMPT = """
 Eres un consultor especializado en PYMES que ayuda a recopilar información esencial del negocio.
@@ -38,7 +51,11 @@ INSTRUCCIONES:
 - Confirma la información antes de continuar al siguiente punto
 - Usa ejemplos para ayudar al usuario a entender qué tipo de información necesitas
 
-INFORMACIÓN YA RECOPILADA:
+Responde de manera natural y enfócate en la siguiente información que necesitas recopilar.
+"""
+
+# Datos del turno: van en el mensaje humano para que el prompt de sistema sea un prefijo fijo
+BUSINESS_INFO_EXTRACTION_INPUT = """INFORMACIÓN YA RECOPILADA:
 {business_info_current}
 
 SIGUIENTE PREGUNTA A HACER:
@@ -47,16 +64,24 @@ SIGUIENTE PREGUNTA A HACER:
 Historial de conversación:
 {conversation_history}
 
-Mensaje actual del usuario: {user_message}
+Mensaje actual del usuario: {user_message}"""
+
+# Plantilla compilada una sola vez al cargar el módulo
+BUSINESS_INFO_EXTRACTION_TEMPLATE = ChatPromptTemplate.from_messages([
+    ("system", BUSINESS_INFO_EXTRACTION_PROMPT), ("human", BUSINESS_INFO_EXTRACTION_INPUT)
+])
+
+@lru_cache
+def get_extraction_llm() -> ChatOpenAI:
+    """Get the chat model used to ask for business information, built once."""
+    return ChatOpenAI(model=LLM_MODEL, temperature=0.1)
 
-Responde de manera natural y enfócate en la siguiente información que necesitas recopilar.
-"""
 
 class BusinessInfoExtractor:
     """Extractor de información del negocio con validación paso a paso."""
     
     def __init__(self):
-        self.llm = ChatOpenAI(model=LLM_MODEL, temperature=0.1)
+        self.llm = get_extraction_llm()
         self.required_fields = [
             "nombre_empresa",
             "sector", 
@@ -112,7 +137,7 @@ class BusinessInfoExtractor:
             # Extraer nombre de empresa del mensaje
             lines = user_message.strip().split('\n')
             for line in lines:
-                if any(keyword in line.lower() for keyword in ["empresa", "negocio", "llamo", "llama"]):
+                if _COMPANY_NAME_HINT_RE.search(line):
                     # Lógica simple de extracción
                     updated_info["nombre_empresa"] = line.strip()
                     break
@@ -188,11 +213,10 @@ def extract_business_info_node(state: PYMESState) -> Dict[str, Any]:
             for msg in messages[-5:]  # Últimos 5 mensajes
         ])
         
-        prompt = ChatPromptTemplate.from_template(BUSINESS_INFO_EXTRACTION_PROMPT)
-        chain = prompt | extractor.llm
+        chain = BUSINESS_INFO_EXTRACTION_TEMPLATE | extractor.llm
         
         response = chain.invoke({
-            "business_info_current": str(business_info),
+            "business_info_current": stable_json(business_info),
             "next_question_focus": next_question_focus,
             "conversation_history": conversation_history,
             "user_message": user_message
@@ -258,6 +282,10 @@ Responde:
 *Por ejemplo: "CORREGIR sector" o "AGREGAR más servicios"*
 """
 
+        # La investigación solo necesita business_info: se adelanta mientras el usuario confirma
+        if RESEARCH_SPECULATIVE_PREFETCH:
+            start_speculative_research(business_info)
+
         # Usar interrupt para esperar confirmación del usuario
         user_validation = interrupt({
             "message": validation_message,
@@ -267,10 +295,11 @@ Responde:
         
         logger.info(f"Validación recibida: {user_validation}")
         
-        # Procesar la respuesta de validación
-        user_response = user_validation.lower().strip()
+        # Procesar la respuesta de validación (una sola pasada sobre el texto)
+        match = _VALIDATION_RE.search(user_validation.strip())
+        decision = match.lastgroup if match else None
         
-        if user_response in ["sí", "si", "yes", "correcto", "ok", "está bien"]:
+        if decision == "confirm":
             # Información validada, continuar al siguiente paso
             logger.info("Información del negocio validada correctamente")
             return Command(
@@ -282,13 +311,12 @@ Responde:
                 goto="research_subgraph"  # Ir al sub-grafo de investigación
             )
         
-        elif "corregir" in user_response or "cambiar" in user_response:
+        elif decision == "change":
             # El usuario quiere corregir algo, volver a la extracción
             logger.info("Usuario quiere corregir información")
+            discard_speculative_research(business_info)
             return Command(
-                update={
-                    "messages": [HumanMessage(content=user_validation)]
-                },
+                update=human_message_update(state, user_validation),
                 goto="extract_business_info"
             )
         
@@ -301,6 +329,9 @@ Responde:
                 goto="validate_business_info"
             )
     
+    except GraphInterrupt:
+        # interrupt() pausa el grafo lanzando GraphInterrupt: no es un error
+        raise
     except Exception as e:
         logger.error(f"Error en validate_business_info_node: {str(e)}")
         return Command(
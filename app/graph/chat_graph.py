@@ -2,6 +2,7 @@ import logging
 import platform
 
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.checkpoint.postgres import PostgresSaver
 from langgraph.graph import StateGraph, START, END, MessagesState
@@ -13,8 +14,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 
-from app.graph.nodes import generate_response, summarize_conversation, human_feedback, \
-   end_node, tools
+from app.graph.nodes import generate_response, agenerate_response, summarize_conversation, human_feedback, \
+   end_node, tools, SUMMARIZE_AFTER_MESSAGES
 from app.database.postgres import get_postgres_saver, get_postgres_store, get_async_postgres_saver
 import os
 from dotenv import load_dotenv
@@ -29,7 +30,7 @@ logger = logging.getLogger(__name__)
 
 def should_summarize(state: PYMESState) -> str:
     """Decide si resumir o continuar."""
-    return "summarize_conversation" if len(state["messages"]) > 6 else "generate_response"
+    return "summarize_conversation" if len(state["messages"]) > SUMMARIZE_AFTER_MESSAGES else "generate_response"
 
 
 # --- Función de Enrutamiento Condicional ---
@@ -63,7 +64,7 @@ def create_chat_graph():
         tool_node_executor = ToolNode(tools)
 
         # Añadir los nodos al grafo
-        workflow.add_node("generate_response", generate_response)
+        workflow.add_node("generate_response", RunnableLambda(generate_response, afunc=agenerate_response))
 
         workflow.add_node("action", tool_node_executor)
         workflow.add_node("human_feedback", human_feedback)
@@ -1,31 +1,96 @@
+import asyncio
 import logging
-from typing import Dict, Any, Literal, List
+from functools import lru_cache
+from typing import Dict, Any, List
+from weakref import WeakKeyDictionary
 
-from dotenv import load_dotenv
-from langchain_community.tools import TavilySearchResults
-from langchain_core.documents import Document
-from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage, SystemMessage, BaseMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage, SystemMessage, BaseMessage, ToolMessage, get_buffer_string
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.output_parsers import StrOutputParser
-from langchain_qdrant import Qdrant
+from langchain_openai import ChatOpenAI
 from langgraph.types import interrupt, Command
-from numpy.f2py.crackfortran import previous_context
-from qdrant_client import QdrantClient
 
-from app.config.settings import LLM_MODEL, QDRANT_URL, QDRANT_API_KEY
+from app.config.settings import (
+    LLM_MODEL, HISTORY_WINDOW, TAVILY_API_KEY,
+    SEARCH_RESULTS_CACHE_TTL, SEARCH_RESULTS_CACHE_MAX_ENTRIES
+)
 from app.core.prompt import SALES_AUTO_NORT_TALK_PROMPT_2
-from app.graph.state import PYMESState
-
-from app.services.document_service import DocumentService
-from app.graph.business_info_extraction import extract_business_info_node, validate_business_info_node, save_to_long_term_memory
-from app.graph.research_subgraph import research_opportunities_node, validate_research_results_node
+from app.graph.state import PYMESState, is_termination_reply
+from app.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Resultados crudos de Tavily por (consulta normalizada, max_results); única caché de búsqueda
+# web, compartida por la herramienta search y por search_many
+_search_results_cache = TTLCache(maxsize=SEARCH_RESULTS_CACHE_MAX_ENTRIES, ttl=SEARCH_RESULTS_CACHE_TTL)
+
+# max_results=3 es un buen punto de partida para no sobrecargar al LLM
+WEB_SEARCH_MAX_RESULTS = 3
+
 
 # --- Definición de Herramientas ---
+@lru_cache
+def get_tavily_search_tool():
+    """Get the Tavily search tool, created once and shared by every search call."""
+    # Import diferido: langchain_community solo se carga si se usa la búsqueda web
+    from langchain_community.tools import TavilySearchResults
+
+    return TavilySearchResults(
+        max_results=WEB_SEARCH_MAX_RESULTS,
+        # include_answer=True # Opcional: Tavily puede intentar dar una respuesta directa
+        # search_depth="advanced" # Opcional: Búsqueda más profunda (puede ser más lenta)
+    )
+
+
+# Un cliente Tavily asíncrono por event loop: su httpx.AsyncClient queda ligado al
+# loop donde se usa por primera vez (loop de FastAPI y loop de fondo compartido)
+_async_tavily_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = WeakKeyDictionary()
+
+
+def get_async_tavily_client():
+    """Get the async Tavily client of the running event loop, created once per loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_tavily_clients.get(loop)
+    if client is None:
+        from tavily import AsyncTavilyClient
+
+        client = AsyncTavilyClient(api_key=TAVILY_API_KEY or None)
+        _async_tavily_clients[loop] = client
+    return client
+
+
+def _search_key(query: str, max_results: int) -> tuple:
+    """Clave de caché de una búsqueda web: consulta normalizada + número de resultados."""
+    return " ".join(query.lower().split()), max_results
+
+
+async def search_many(queries: List[str], max_results: int = WEB_SEARCH_MAX_RESULTS) -> List[Any]:
+    """
+    Lanza varias búsquedas web en paralelo.
+
+    Devuelve, por posición, la lista de resultados de cada consulta o la
+    excepción que produjo, para que un fallo no anule el resto. Las consultas
+    ya resueltas (misma consulta normalizada) se sirven desde caché sin red.
+    """
+    keys = [_search_key(query, max_results) for query in queries]
+    cached = [_search_results_cache.get(key) for key in keys]
+    pending = [i for i, results in enumerate(cached) if results is None]
+
+    if pending:
+        client = get_async_tavily_client()
+        responses = await asyncio.gather(
+            *(client.search(queries[i], max_results=max_results) for i in pending),
+            return_exceptions=True
+        )
+        for i, response in zip(pending, responses):
+            if isinstance(response, Exception):
+                cached[i] = response
+            else:
+                cached[i] = response.get("results", [])
+                _search_results_cache.set(keys[i], cached[i])
+
+    return cached
+
+
 @tool
 def search(query: str) -> str:
     """
@@ -33,63 +98,75 @@ def search(query: str) -> str:
     reseñas de usuarios recientes, comparativas con modelos de OTRAS marcas, noticias sobre Toyota,
     o cualquier información que NO se espere encontrar en la documentación interna del concesionario.
     """
+    cache_key = _search_key(query, WEB_SEARCH_MAX_RESULTS)
     try:
-        # Crear la instancia de la herramienta Tavily
-        # max_results=3 es un buen punto de partida para no sobrecargar al LLM
-        tavily_search_tool = TavilySearchResults(
-            max_results=3,
-            # include_answer=True # Opcional: Tavily puede intentar dar una respuesta directa
-            # search_depth="advanced" # Opcional: Búsqueda más profunda (puede ser más lenta)
-        )
-
-        # Invocar la herramienta
-        # Tavily puede manejar directamente el string de la consulta
-        results = tavily_search_tool.invoke(query)
+        results = _search_results_cache.get(cache_key)
+        if results is not None:
+            logger.info(f"🎯 Búsqueda web servida desde caché: '{query}'")
+        else:
+            # Invocar la herramienta
+            # Tavily puede manejar directamente el string de la consulta
+            results = get_tavily_search_tool().invoke(query)
+            if isinstance(results, list):
+                _search_results_cache.set(cache_key, results)
 
         # Procesar y formatear los resultados para el LLM
         if not results:
             logger.info("Tavily no devolvió resultados.")
             return "No se encontraron resultados relevantes en la búsqueda web."
 
-        # Formatear la salida como un string legible
-        formatted_output = f"Resultados de la búsqueda web para '{query}':\n\n"
+        # Formatear la salida como un string legible (se acumulan partes y se unen una sola vez)
+        parts = [f"Resultados de la búsqueda web para '{query}':\n\n"]
         
         # Verificar si results es una lista o un string
         if isinstance(results, str):
             # Si Tavily devuelve un string directamente, usarlo tal como está
-            formatted_output += results
+            parts.append(results)
             logger.info(f"Tavily devolvió resultado como string de {len(results)} caracteres.")
         elif isinstance(results, list):
             # results es una lista de diccionarios
             for i, result in enumerate(results):
-                if isinstance(result, dict) and 'content' in result and 'url' in result:
-                    formatted_output += f"Resultado {i + 1}:\n"
-                    formatted_output += f"  Contenido: {result.get('content', 'N/A')}\n"
-                    formatted_output += f"  Fuente URL: {result.get('url', 'N/A')}\n\n"
-                    # Opcional: incluir 'title' si es útil:
+                # Camino habitual: el esquema de Tavily trae 'content' y 'url'
+                try:
+                    # 'title' es opcional en el esquema de Tavily
                     title = result.get('title')
-                    if title: 
-                        formatted_output += f"  Título: {title}\n"
-                elif isinstance(result, dict):
-                    # Manejar otros formatos de diccionario
-                    formatted_output += f"Resultado {i + 1}:\n"
-                    for key, value in result.items():
-                        formatted_output += f"  {key}: {value}\n"
-                    formatted_output += "\n"
-                else:
-                    logger.warning(f"Formato de resultado inesperado de Tavily: {type(result)} - {result}")
-                    formatted_output += f"Resultado {i + 1}: {str(result)}\n\n"
+                    parts.append(
+                        f"Resultado {i + 1}:\n"
+                        f"  Contenido: {result['content']}\n"
+                        f"  Fuente URL: {result['url']}\n"
+                        + (f"  Título: {title}\n" if title else "")
+                        + "\n"
+                    )
+                except (KeyError, TypeError, AttributeError):
+                    if isinstance(result, dict):
+                        # Manejar otros formatos de diccionario
+                        parts.append(f"Resultado {i + 1}:\n")
+                        parts.extend(f"  {key}: {value}\n" for key, value in result.items())
+                        parts.append("\n")
+                    else:
+                        logger.warning(f"Formato de resultado inesperado de Tavily: {type(result)} - {result}")
+                        parts.append(f"Resultado {i + 1}: {str(result)}\n\n")
             logger.info(f"Tavily devolvió {len(results)} resultados.")
         else:
             logger.warning(f"Formato de resultados inesperado de Tavily: {type(results)} - {results}")
-            formatted_output += f"Resultados: {str(results)}"
-        return formatted_output.strip()
+            parts.append(f"Resultados: {str(results)}")
+        return "".join(parts).strip()
 
     except Exception as e:
         logger.error(f"Error durante la búsqueda con Tavily: {str(e)}")
         return f"Se produjo un error al intentar realizar la búsqueda web: {str(e)}"
 
 
+# Longitud mínima de una consulta a la base documental
+MIN_DOCUMENT_QUERY_LENGTH = 3
+
+
+def _format_document(i: int, doc: Dict[str, Any]) -> str:
+    """Documento numerado con su título (o un título genérico) y su contenido."""
+    title = (doc.get("metadata") or {}).get("name") or f"Documento {i}"
+    return f"Documento {i}: {title}\n{doc['content']}"
+
+
 @tool
 def search_documents(query: str, limit: int = 3):
     """
@@ -98,6 +175,13 @@ def search_documents(query: str, limit: int = 3):
     detalles técnicos proporcionados por Toyota, etc. Usa esta herramienta cuando necesites datos precisos
     de la documentación oficial de AUTONORT o Toyota Perú. NO la uses para buscar precios de mercado generales o reseñas externas.
     """
+    # Import diferido: Qdrant, Google Drive y los embeddings solo se cargan si se consultan documentos
+    from app.services.document_service import get_document_service
+
+    # Consultas sin contenido útil: no se llama a Qdrant
+    if len(query.strip()) < MIN_DOCUMENT_QUERY_LENGTH:
+        return "No se encontraron documentos relevantes."
+
     try:
         document_service = get_document_service()
         results = document_service.search_documents(query, limit=limit)
@@ -106,13 +190,8 @@ def search_documents(query: str, limit: int = 3):
         if not results:
             return "No se encontraron documentos relevantes."
 
-        formatted_results = []
-        for i, doc in enumerate(results, 1):
-            title = doc["metadata"].get("name", f"Documento {i}")
-            formatted_results.append(f"Documento {i}: {title}\n{doc['content']}")
-
-        logger.info(f"Búsqueda de documentos para '{query[:50]}...' encontró {len(formatted_results)} resultados")
-        return "\n\n---\n\n".join(formatted_results)
+        logger.info(f"Búsqueda de documentos para '{query[:50]}...' encontró {len(results)} resultados")
+        return "\n\n---\n\n".join(_format_document(i, doc) for i, doc in enumerate(results, 1))
     except Exception as e:
         logger.error(f"Error en search_documents: {str(e)}")
         return "Error al buscar documentos."
@@ -121,20 +200,48 @@ def search_documents(query: str, limit: int = 3):
 # Lista de herramientas disponibles para el LLM
 tools = [search, search_documents]
 
-# Singleton document service
-_document_service = None
+@lru_cache
+def get_response_llm():
+    """Get the chat model with the node tools bound, built once and reused across turns."""
+    return ChatOpenAI(model=LLM_MODEL).bind_tools(tools)
+
+
+@lru_cache
+def get_summary_llm() -> ChatOpenAI:
+    """Get the chat model used to summarize the conversation, built once."""
+    return ChatOpenAI(model=LLM_MODEL)
+
+
+# Saludo cuando todavía no hay historial
+WELCOME_MESSAGE = "Estimado (a) cliente buen día, le saluda Jordy Merejildo de Autonort TOYOTA  ¿Cómo podemos ayudarte?"
 
+# Mensaje del sistema idéntico en cada turno para aprovechar el caché de prefijo del proveedor.
+# La consulta llega como último HumanMessage, así que no hace falta un ChatPromptTemplate.
+GENERATE_RESPONSE_SYSTEM_MESSAGE = SystemMessage(content=SALES_AUTO_NORT_TALK_PROMPT_2 + (
+    "\n\n**Instrucciones Adicionales:** Tienes acceso a una herramienta de búsqueda web (`search`). "
+    "Úsala si la información proporcionada (contexto, historial) no es suficiente para responder la pregunta "
+    "del usuario, o si pide explícitamente información externa (ej. reseñas, comparativas actuales, precios de mercado)."
+))
 
-def get_document_service() -> DocumentService:
-    """Get or create a DocumentService singleton."""
-    global _document_service
-    if _document_service is None:
-        try:
-            _document_service = DocumentService()
-        except Exception as e:
-            logger.error(f"Error initializing document service: {str(e)}")
-            raise
-    return _document_service
+
+def _response_window(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Mensajes recientes que se envían al LLM, sin ToolMessages huérfanos al inicio."""
+    # Limitar la cantidad de mensajes en el historial
+    recent_messages = messages[-HISTORY_WINDOW:]
+    # Un ToolMessage huérfano (sin su AIMessage con tool_calls) es rechazado por la API
+    while recent_messages and isinstance(recent_messages[0], ToolMessage):
+        recent_messages = recent_messages[1:]
+    return [GENERATE_RESPONSE_SYSTEM_MESSAGE, *recent_messages]
+
+
+def _log_prompt_cache_usage(response_message: BaseMessage) -> None:
+    """Tokens del prefijo servidos desde el caché de prompts del proveedor."""
+    usage = response_message.usage_metadata or {}
+    logger.debug(
+        "Prompt tokens: %s, cacheados: %s",
+        usage.get("input_tokens", 0),
+        usage.get("input_token_details", {}).get("cache_read", 0)
+    )
 
 
 def generate_response(state: PYMESState) -> Dict[str, Any]:
@@ -147,38 +254,36 @@ def generate_response(state: PYMESState) -> Dict[str, Any]:
     Returns:
         Updated state with the generated answer.
     """
+    # Sin historial: saludo fijo antes de tocar el LLM o el prompt
+    messages: List[BaseMessage] = state.get("messages") or []
+    if not messages:
+        logger.warning("Agent node called with empty messages state.")
+        return {"messages": [AIMessage(content=WELCOME_MESSAGE)]}
+
     try:
-        llm = ChatOpenAI(model=LLM_MODEL)
-        llm_with_tools = llm.bind_tools(tools)
-
-        messages: List[BaseMessage] = state.get("messages",
-                                                [])
-        if not messages:
-            logger.warning("Agent node called with empty messages state.")
-            return {"messages": [AIMessage(
-                content="Estimado (a) cliente buen día, le saluda Jordy Merejildo de Autonort TOYOTA  ¿Cómo podemos ayudarte?")]}
-
-        user_query = state["input"]
-        # Limitar la cantidad de mensajes en el historial
-        recent_messages = state["messages"][-7:] if len(state["messages"]) > 7 else state["messages"]
-
-        # Construir el mensaje del sistema con el contexto y resumen
-        system_message_content = SALES_AUTO_NORT_TALK_PROMPT_2.format(
-            user_query=user_query,
-        )
-        system_message_content += "\n\n**Instrucciones Adicionales:** Tienes acceso a una herramienta de búsqueda web (`search`). Úsala si la información proporcionada (contexto, historial) no es suficiente para responder la pregunta del usuario, o si pide explícitamente información externa (ej. reseñas, comparativas actuales, precios de mercado)."
+        # Invocar el LLM vinculado a herramientas con el mensaje del sistema y la ventana reciente
+        response_message = get_response_llm().invoke(_response_window(messages))
+        _log_prompt_cache_usage(response_message)
 
-        # Construir el prompt
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_message_content),
-            MessagesPlaceholder(variable_name="messages"),
-            # La entrada del usuario ya debe estar en state["messages"] añadida por el reducer o el servicio
-        ])
+        return {
+            "messages": [response_message],
+        }
+
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}")
+        raise Exception("I'm sorry, I encountered an error generating a response.")
 
-        # Ejecutar la cadena con el LLM vinculado a herramientas
-        chain = prompt | llm_with_tools
-        # La entrada para invoke es el estado actual del grafo relevante para el placeholder
-        response_message = chain.invoke({"messages": state["messages"]})
+
+async def agenerate_response(state: PYMESState) -> Dict[str, Any]:
+    """Async version of generate_response: awaits the LLM instead of blocking a worker thread."""
+    messages: List[BaseMessage] = state.get("messages") or []
+    if not messages:
+        logger.warning("Agent node called with empty messages state.")
+        return {"messages": [AIMessage(content=WELCOME_MESSAGE)]}
+
+    try:
+        response_message = await get_response_llm().ainvoke(_response_window(messages))
+        _log_prompt_cache_usage(response_message)
 
         return {
             "messages": [response_message],
@@ -189,6 +294,32 @@ def generate_response(state: PYMESState) -> Dict[str, Any]:
         raise Exception("I'm sorry, I encountered an error generating a response.")
 
 
+# Umbral a partir del cual se resume la conversación y mensajes que se conservan sin resumir
+SUMMARIZE_AFTER_MESSAGES = 6
+SUMMARY_KEEP_MESSAGES = 2
+
+
+def _summary_request(state: PYMESState) -> List[BaseMessage]:
+    """Mensaje para el LLM que extiende el resumen con los mensajes que se van a eliminar."""
+    # Solo se resumen los mensajes que se van a eliminar; los 2 más recientes se conservan tal cual
+    evicted = state["messages"][:-SUMMARY_KEEP_MESSAGES]
+
+    summary = state.get("summary", "")
+    summary_prompt = (
+        f"This is the current summary: {summary}\nExtend it with the new messages:"
+        if summary else "Create a summary of the following conversation:"
+    )
+
+    # Los mensajes a resumir van como texto: no arrastra tool calls sin su respuesta
+    return [HumanMessage(content=f"{summary_prompt}\n\n{get_buffer_string(evicted)}")]
+
+
+def _summary_update(state: PYMESState, summary: str) -> Dict[str, Any]:
+    """Nuevo resumen y eliminación de todos los mensajes excepto los 2 más recientes."""
+    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-SUMMARY_KEEP_MESSAGES]]
+    return {"summary": summary, "messages": delete_messages}
+
+
 def summarize_conversation(state: PYMESState) -> Dict[str, Any]:
     """
     Summarizes the conversation and removes old messages.
@@ -199,29 +330,28 @@ def summarize_conversation(state: PYMESState) -> Dict[str, Any]:
     Returns:
         Updated state with summary and trimmed messages.
     """
-    llm = ChatOpenAI(model=LLM_MODEL)
+    # Historial corto: no hay nada que compactar y no se llama al LLM
+    if len(state["messages"]) <= SUMMARIZE_AFTER_MESSAGES:
+        return {}
 
-    summary = state.get("summary", "")
-    summary_prompt = (
-        f"This is the current summary: {summary}\nExtend it with the new messages:"
-        if summary else "Create a summary of the conversation above:"
-    )
+    response = get_summary_llm().invoke(_summary_request(state))
+    return _summary_update(state, response.content)
 
-    # Agregar el prompt al historial y ejecutar el resumen con el modelo
-    messages = state["messages"] + [HumanMessage(content=summary_prompt)]
-    response = llm.invoke(messages)
 
-    # Eliminar todos los mensajes excepto los 2 más recientes
-    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]]
+async def asummarize_conversation(state: PYMESState) -> Dict[str, Any]:
+    """Async version of summarize_conversation."""
+    if len(state["messages"]) <= SUMMARIZE_AFTER_MESSAGES:
+        return {}
 
-    return {"summary": response.content, "messages": delete_messages}
+    response = await get_summary_llm().ainvoke(_summary_request(state))
+    return _summary_update(state, response.content)
 
 
 def human_feedback(state: PYMESState) -> Command:
     """
     Nodo de feedback humano para una conversación multi-turno.
     Espera la retroalimentación del usuario y actualiza el estado.
-    Si el usuario escribe "done", "gracias" o "adiós", finaliza la conversación;
+    Si el usuario escribe "done", "gracias", "adiós" o "chao", finaliza la conversación;
     en caso contrario, retorna al nodo de generación para continuar.
     """
     # El print "[human_feedback] Esperando retroalimentación del usuario..."
@@ -245,24 +375,17 @@ def human_feedback(state: PYMESState) -> Command:
     # Este print ahora sí mostrará el feedback real que el usuario envió y que reanudó la interrupción
     print(f"\n[human_feedback] Feedback recibido del usuario (tras reanudar interrupt): {user_input_from_interrupt}")
 
-    # Actualiza el historial de feedback (esto es para tu propio tracking si lo necesitas)
-    updated_feedback_list = state.get("feedback", []) + [user_input_from_interrupt]
-
     # El mensaje del usuario DEBE ser añadido al historial de conversación
     # para que generate_response lo vea.
     user_message_for_history = HumanMessage(content=user_input_from_interrupt)
 
-    # El campo 'input' del estado se usa en generate_response para el prompt.
-    # Es correcto actualizarlo con la última entrada del usuario.
-    current_user_input_for_state = user_input_from_interrupt
-
     update_payload = {
         "messages": [user_message_for_history],  # Esto será recogido por add_messages
-        "feedback": updated_feedback_list,
-        "input": current_user_input_for_state
+        "feedback": [user_input_from_interrupt],  # El reducer del canal lo añade al historial
+        "last_human_idx": len(state.get("messages", []))  # Posición que ocupará el nuevo mensaje
     }
 
-    if user_input_from_interrupt.strip().lower() in ["done", "gracias", "adiós", "adios"]:
+    if is_termination_reply(user_input_from_interrupt):
         logger.info(f"Usuario {state.get('thread_id', 'unknown')} finalizó conversación con: {user_input_from_interrupt}")
         return Command(update=update_payload, goto="end_node")
     else:
@@ -282,6 +405,5 @@ def end_node(state: PYMESState) -> Dict[str, Any]:
     """
     logger.info("Conversation completed successfully.")
     return {
-        "answer": f"Gracias por su consulta sobre vehículos Toyota. Esperamos haberle sido de ayuda.",
-        "feedback": state.get("feedback", [])
+        "answer": f"Gracias por su consulta sobre vehículos Toyota. Esperamos haberle sido de ayuda."
     }
@@ -1,19 +1,21 @@
 import logging
+import threading
 from typing import Literal, Dict, Any
 from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 
 from app.config.settings import LLM_MODEL
 from app.graph.state import PYMESState
-from app.graph.nodes import generate_response, human_feedback, end_node, tools
+from app.graph.nodes import generate_response, agenerate_response, human_feedback, end_node, tools
 from app.graph.business_info_extraction import (
     extract_business_info_node, 
     validate_business_info_node, 
     save_to_long_term_memory
 )
 from app.graph.research_subgraph import (
-    research_opportunities_node, 
+    research_opportunities_runnable,
     validate_research_results_node
 )
 from app.database.postgres import get_postgres_saver, get_postgres_store
@@ -22,6 +24,11 @@ from langgraph.prebuilt import ToolNode
 logger = logging.getLogger(__name__)
 
 
+# Campos mínimos del negocio para pasar a la conversación normal
+_REQUIRED_FIELDS = ("nombre_empresa", "sector", "productos_servicios_principales", "ubicacion")
+_EXTRACTION_STAGES = frozenset({"info_gathering", None})
+
+
 def determine_initial_flow(state: PYMESState) -> Literal["extract_business_info", "generate_response"]:
     """
     Determina si necesitamos recopilar información del negocio o si ya podemos conversar.
@@ -30,65 +37,50 @@ def determine_initial_flow(state: PYMESState) -> Literal["extract_business_info"
     stage = state.get("stage", "info_gathering")
     
     # Si no tenemos información básica del negocio, iniciar extracción
-    required_fields = ["nombre_empresa", "sector", "productos_servicios_principales", "ubicacion"]
-    missing_fields = [field for field in required_fields if not business_info.get(field)]
-    
-    if missing_fields and stage in ["info_gathering", None]:
-        logger.info(f"Información faltante del negocio: {missing_fields}. Iniciando extracción.")
+    if stage in _EXTRACTION_STAGES and any(not business_info.get(field) for field in _REQUIRED_FIELDS):
+        if logger.isEnabledFor(logging.INFO):
+            missing_fields = [field for field in _REQUIRED_FIELDS if not business_info.get(field)]
+            logger.info(f"Información faltante del negocio: {missing_fields}. Iniciando extracción.")
         return "extract_business_info"
     else:
         logger.info("Información del negocio disponible. Continuando con conversación normal.")
         return "generate_response"
 
 
+# Tablas de enrutamiento por etapa: una sola búsqueda en dict por arista
+_ROUTE_AFTER_EXTRACTION = {"research_needed": "research_opportunities"}
+_ROUTE_AFTER_VALIDATION = {"analysis": "save_to_memory"}
+_ROUTE_AFTER_MEMORY_SAVE = {"info_completed": "research_opportunities"}
+_ROUTE_AFTER_RESEARCH = {"research_completed": "validate_research_results"}
+
+
 def route_after_extraction(state: PYMESState) -> Literal["validate_business_info", "research_opportunities"]:
     """
     Ruta después de la extracción de información.
     """
-    stage = state.get("stage", "")
-    
-    if stage == "info_gathering":
-        return "validate_business_info"
-    elif stage == "research_needed":
-        return "research_opportunities"
-    else:
-        return "validate_business_info"
+    return _ROUTE_AFTER_EXTRACTION.get(state.get("stage"), "validate_business_info")
 
 
 def route_after_validation(state: PYMESState) -> Literal["save_to_memory", "extract_business_info"]:
     """
     Ruta después de la validación de información del negocio.
     """
-    stage = state.get("stage", "")
-    
-    if stage == "analysis":
-        return "save_to_memory"
-    else:
-        return "extract_business_info"  # Volver a extraer si necesita correcciones
+    # Volver a extraer si necesita correcciones
+    return _ROUTE_AFTER_VALIDATION.get(state.get("stage"), "extract_business_info")
 
 
 def route_after_memory_save(state: PYMESState) -> Literal["research_opportunities", "generate_response"]:
     """
     Ruta después de guardar en memoria.
     """
-    stage = state.get("stage", "")
-    
-    if stage == "info_completed":
-        return "research_opportunities"
-    else:
-        return "generate_response"
+    return _ROUTE_AFTER_MEMORY_SAVE.get(state.get("stage"), "generate_response")
 
 
 def route_after_research(state: PYMESState) -> Literal["validate_research_results", "generate_response"]:
     """
     Ruta después de la investigación.
     """
-    stage = state.get("stage", "")
-    
-    if stage == "research_completed":
-        return "validate_research_results"
-    else:
-        return "generate_response"
+    return _ROUTE_AFTER_RESEARCH.get(state.get("stage"), "generate_response")
 
 
 def route_conversation_flow(state: PYMESState) -> Literal["action", "human_feedback"]:
@@ -108,20 +100,9 @@ def route_conversation_flow(state: PYMESState) -> Literal["action", "human_feedb
         return "human_feedback"
 
 
-def welcome_node(state: PYMESState) -> Dict[str, Any]:
-    """
-    Nodo de bienvenida que inicia el proceso de recopilación de información.
-    """
-    try:
-        logger.info("Iniciando proceso PYMES con mensaje de bienvenida")
-        
-        # Verificar si ya tenemos información del negocio
-        business_info = state.get("business_info", {})
-        
-        if business_info and business_info.get("nombre_empresa"):
-            # Ya tenemos información, saludar y ofrecer ayuda
-            welcome_message = f"""
-¡Hola! Veo que ya tengo información sobre **{business_info.get('nombre_empresa')}**.
+# Mensajes de bienvenida: fijo para usuarios nuevos, plantilla con el nombre para los que vuelven
+_WELCOME_RETURNING = """
+¡Hola! Veo que ya tengo información sobre **{nombre_empresa}**.
 
 ¿En qué puedo ayudarte hoy?
 - 🔍 **Investigar nuevas oportunidades** de crecimiento
@@ -130,10 +111,9 @@ def welcome_node(state: PYMESState) -> Dict[str, Any]:
 - ✏️ **Actualizar información** del negocio
 
 ¿Qué te gustaría hacer?
-"""
-        else:
-            # No tenemos información, iniciar proceso de recopilación
-            welcome_message = """
+""".format
+
+_WELCOME_NEW = """
 ¡Hola! Soy tu asistente especializado en PYMES 🚀
 
 Te ayudo a identificar oportunidades de crecimiento y desarrollar estrategias específicas para tu negocio.
@@ -144,6 +124,24 @@ Para comenzar, necesito conocer algunos detalles básicos sobre tu empresa. Este
 
 *Por ejemplo: "Mi empresa se llama [Nombre] y nos dedicamos a [actividad principal]"*
 """
+
+
+def welcome_node(state: PYMESState) -> Dict[str, Any]:
+    """
+    Nodo de bienvenida que inicia el proceso de recopilación de información.
+    """
+    try:
+        logger.info("Iniciando proceso PYMES con mensaje de bienvenida")
+        
+        # Verificar si ya tenemos información del negocio
+        business_info = state.get("business_info", {})
+        
+        if business_info and business_info.get("nombre_empresa"):
+            # Ya tenemos información, saludar y ofrecer ayuda
+            welcome_message = _WELCOME_RETURNING(nombre_empresa=business_info["nombre_empresa"])
+        else:
+            # No tenemos información, iniciar proceso de recopilación
+            welcome_message = _WELCOME_NEW
         
         return {
             "messages": [AIMessage(content=welcome_message)],
@@ -158,7 +156,26 @@ Para comenzar, necesito conocer algunos detalles básicos sobre tu empresa. Este
         }
 
 
+_pymes_graph = None
+_pymes_graph_lock = threading.Lock()
+
+
 def create_pymes_graph():
+    """
+    Devuelve el grafo principal de PYMES.
+    Se compila una sola vez por proceso y se comparte entre peticiones.
+    """
+    global _pymes_graph
+
+    if _pymes_graph is None:
+        with _pymes_graph_lock:
+            if _pymes_graph is None:
+                _pymes_graph = _build_pymes_graph()
+
+    return _pymes_graph
+
+
+def _build_pymes_graph():
     """
     Crea el grafo principal de PYMES con todos los sub-grafos integrados.
     """
@@ -174,11 +191,11 @@ def create_pymes_graph():
         workflow.add_node("extract_business_info", extract_business_info_node)
         workflow.add_node("validate_business_info", validate_business_info_node)
         workflow.add_node("save_to_memory", save_to_long_term_memory)
-        workflow.add_node("research_opportunities", research_opportunities_node)
+        workflow.add_node("research_opportunities", research_opportunities_runnable)
         workflow.add_node("validate_research_results", validate_research_results_node)
         
         # === NODOS DE CONVERSACIÓN ===
-        workflow.add_node("generate_response", generate_response)
+        workflow.add_node("generate_response", RunnableLambda(generate_response, afunc=agenerate_response))
         workflow.add_node("action", tool_node_executor)
         workflow.add_node("human_feedback", human_feedback)
         workflow.add_node("end_node", end_node)
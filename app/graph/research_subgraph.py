@@ -1,24 +1,40 @@
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any, List
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Any, List, Tuple
+from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
-from langchain_community.tools import TavilySearchResults
+from langgraph.errors import GraphInterrupt
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 
-from app.config.settings import LLM_MODEL
-from app.graph.state import PYMESState
+from app.config.settings import (
+    LLM_MODEL,
+    RESEARCH_CACHE_TTL,
+    RESEARCH_RESULT_MAX_CHARS,
+    RESEARCH_TEXT_MAX_CHARS,
+    RESEARCH_SPECULATIVE_SEARCH
+)
+from app.graph.nodes import search_many
+from app.graph.state import PYMESState, get_last_user_input, human_message_update
+from app.services.llm_cache import get_llm_cache
+from app.utils.async_utils import run_coroutine_sync
+from app.utils.cache import TTLCache
+from app.utils.serialization import stable_json
 
 logger = logging.getLogger(__name__)
 
-# Prompt para investigación de oportunidades
+# Prompts de investigación: las instrucciones fijas van en el mensaje de sistema (prefijo
+# cacheable por el proveedor) y los datos de cada negocio en el mensaje humano
 RESEARCH_OPPORTUNITIES_PROMPT = """
 Eres un consultor experto en PYMES especializado en identificar oportunidades de crecimiento y mejora.
 
-INFORMACIÓN DEL NEGOCIO:
-{business_info}
-
 INSTRUCCIONES:
 1. Analiza la información del negocio proporcionada
 2. Identifica áreas clave de oportunidad basadas en:
@@ -45,14 +61,17 @@ Ejemplo:
 
 """
 
-ANALYSIS_PROMPT = """
-Eres un consultor de PYMES experto en análisis de oportunidades de crecimiento.
+RESEARCH_OPPORTUNITIES_INPUT = """INFORMACIÓN DEL NEGOCIO:
+{business_info}{follow_up}"""
 
-INFORMACIÓN DEL NEGOCIO:
-{business_info}
+# Se añade al mensaje humano cuando el usuario pide más investigación sobre algo concreto
+FOLLOW_UP_INPUT = """
 
-RESULTADOS DE INVESTIGACIÓN:
-{research_results}
+SOLICITUD ADICIONAL DEL USUARIO:
+{request}"""
+
+ANALYSIS_PROMPT = """
+Eres un consultor de PYMES experto en análisis de oportunidades de crecimiento.
 
 INSTRUCCIONES:
 Basándote en la información del negocio y los resultados de la investigación, genera un análisis completo que incluya:
@@ -66,88 +85,162 @@ Basándote en la información del negocio y los resultados de la investigación,
 Sé específico y práctico. Todas las recomendaciones deben ser aplicables al contexto específico del negocio.
 """
 
+ANALYSIS_INPUT = """INFORMACIÓN DEL NEGOCIO:
+{business_info}
+
+RESULTADOS DE INVESTIGACIÓN:
+{research_results}"""
+
+# Líneas de viñeta ("- consulta" o "• consulta") de la respuesta del LLM
+_QUERY_LINE_RE = re.compile(r"^[ \t]*[-•][-• \t]*(\S.*?)[ \t]*$", re.MULTILINE)
+
+# Campos de cada resultado de investigación, en el orden en que se formatean
+_RESULT_FIELDS = itemgetter("query", "title", "content", "url")
+
+# Plantillas compiladas una sola vez al cargar el módulo
+RESEARCH_QUERIES_TEMPLATE = ChatPromptTemplate.from_messages([
+    ("system", RESEARCH_OPPORTUNITIES_PROMPT), ("human", RESEARCH_OPPORTUNITIES_INPUT)
+])
+ANALYSIS_TEMPLATE = ChatPromptTemplate.from_messages([("system", ANALYSIS_PROMPT), ("human", ANALYSIS_INPUT)])
+
+
+@lru_cache
+def get_research_llm() -> ChatOpenAI:
+    """Get the research chat model, built once so its HTTP client and connection pool are reused."""
+    # Misma información del negocio, mismo prompt: la respuesta se reutiliza entre reinicios
+    return ChatOpenAI(model=LLM_MODEL, temperature=0.1, cache=get_llm_cache())
+
 
 class ResearchAgent:
     """Agente de investigación para PYMES."""
     
     def __init__(self):
-        self.llm = ChatOpenAI(model=LLM_MODEL, temperature=0.1)
-        self.search_tool = TavilySearchResults(max_results=3)
+        self.llm = get_research_llm()
+        self.queries_chain = RESEARCH_QUERIES_TEMPLATE | self.llm
+        self.analysis_chain = ANALYSIS_TEMPLATE | self.llm
     
-    def generate_search_queries(self, business_info: Dict[str, Any]) -> List[str]:
+    @staticmethod
+    def _parse_queries(content: str) -> List[str]:
+        """Extrae las consultas (líneas de viñeta) de la respuesta del LLM en una sola pasada."""
+        queries = _QUERY_LINE_RE.findall(content)[:5]  # Limitar a 5 búsquedas para no sobrecargar
+        logger.info(f"Generadas {len(queries)} consultas de búsqueda")
+        return queries
+
+    @staticmethod
+    def _fallback_queries(business_info: Dict[str, Any]) -> List[str]:
+        """Consultas genéricas cuando el LLM no está disponible."""
+        return [
+            f"oportunidades crecimiento {business_info.get('sector', 'negocio')} {business_info.get('ubicacion', 'Peru')}",
+            f"tendencias {business_info.get('sector', 'industria')} 2024",
+            f"mejores prácticas PYMES {business_info.get('sector', 'pequeños negocios')}"
+        ]
+
+    @staticmethod
+    def _queries_input(business_info: Dict[str, Any], follow_up: str) -> Dict[str, str]:
+        """Entrada del prompt de consultas; sin seguimiento queda idéntica a la primera visita."""
+        return {
+            "business_info": stable_json(business_info),
+            "follow_up": FOLLOW_UP_INPUT.format(request=follow_up) if follow_up else ""
+        }
+
+    def generate_search_queries(self, business_info: Dict[str, Any], follow_up: str = "") -> List[str]:
         """Genera consultas de búsqueda específicas basadas en la información del negocio."""
         try:
-            prompt = ChatPromptTemplate.from_template(RESEARCH_OPPORTUNITIES_PROMPT)
-            chain = prompt | self.llm
-            
-            response = chain.invoke({"business_info": str(business_info)})
-            
-            # Extraer las consultas del resultado
-            queries = []
-            for line in response.content.split('\n'):
-                line = line.strip()
-                if line and (line.startswith('-') or line.startswith('•')):
-                    query = line.lstrip('-• ').strip()
-                    if query:
-                        queries.append(query)
-            
-            logger.info(f"Generadas {len(queries)} consultas de búsqueda")
-            return queries[:5]  # Limitar a 5 búsquedas para no sobrecargar
-            
+            response = self.queries_chain.invoke(self._queries_input(business_info, follow_up))
+            return self._parse_queries(response.content)
         except Exception as e:
             logger.error(f"Error generando consultas de búsqueda: {str(e)}")
-            return [
-                f"oportunidades crecimiento {business_info.get('sector', 'negocio')} {business_info.get('ubicacion', 'Peru')}",
-                f"tendencias {business_info.get('sector', 'industria')} 2024",
-                f"mejores prácticas PYMES {business_info.get('sector', 'pequeños negocios')}"
-            ]
+            return self._fallback_queries(business_info)
+
+    async def agenerate_search_queries(self, business_info: Dict[str, Any], follow_up: str = "") -> List[str]:
+        """Versión asíncrona de generate_search_queries."""
+        try:
+            response = await self.queries_chain.ainvoke(self._queries_input(business_info, follow_up))
+            return self._parse_queries(response.content)
+        except Exception as e:
+            logger.error(f"Error generando consultas de búsqueda: {str(e)}")
+            return self._fallback_queries(business_info)
     
-    def search_opportunities(self, queries: List[str]) -> List[Dict[str, str]]:
-        """Realiza búsquedas web para cada consulta."""
+    async def asearch_opportunities(self, queries: List[str]) -> List[Dict[str, str]]:
+        """Realiza las búsquedas web de todas las consultas en paralelo."""
         all_results = []
-        
-        for query in queries:
-            try:
-                logger.info(f"Buscando: {query}")
-                results = self.search_tool.invoke(query)
-                
-                for result in results:
-                    if isinstance(result, dict):
-                        all_results.append({
-                            "query": query,
-                            "content": result.get("content", ""),
-                            "url": result.get("url", ""),
-                            "title": result.get("title", "")
-                        })
-                
-            except Exception as e:
-                logger.error(f"Error en búsqueda '{query}': {str(e)}")
+
+        logger.info(f"Buscando en paralelo: {queries}")
+        try:
+            batches = await search_many(queries)
+        except Exception as e:
+            logger.error(f"Error en búsquedas de investigación: {str(e)}")
+            return all_results
+
+        # Distintas consultas suelen devolver la misma página: se envía una sola vez al análisis
+        seen_urls = set()
+        seen_contents = set()
+        dropped = 0
+        for query, results in zip(queries, batches):
+            if isinstance(results, Exception):
+                logger.warning(f"Error en búsqueda '{query}': {str(results)}")
                 continue
-        
-        logger.info(f"Recopilados {len(all_results)} resultados de investigación")
+
+            for result in results:
+                if not isinstance(result, dict):
+                    continue
+                url = result.get("url", "")
+                content = result.get("content", "")
+                content_key = hashlib.blake2b(content[:512].encode("utf-8"), digest_size=8).digest()
+                if (url and url in seen_urls) or content_key in seen_contents:
+                    dropped += 1
+                    continue
+                if url:
+                    seen_urls.add(url)
+                seen_contents.add(content_key)
+
+                all_results.append({
+                    "query": query,
+                    "content": content,
+                    "url": url,
+                    "title": result.get("title", "")
+                })
+
+        logger.info(f"Recopilados {len(all_results)} resultados de investigación ({dropped} duplicados descartados)")
         return all_results
+
+    def search_opportunities(self, queries: List[str]) -> List[Dict[str, str]]:
+        """Versión síncrona: ejecuta asearch_opportunities en el loop de fondo compartido."""
+        return run_coroutine_sync(self.asearch_opportunities(queries))
     
+    @staticmethod
+    def _format_research_results(research_results: List[Dict[str, str]]) -> str:
+        """
+        Texto de los resultados de investigación para el prompt de análisis.
+        Cada contenido se recorta a RESEARCH_RESULT_MAX_CHARS y se dejan de añadir
+        resultados al alcanzar RESEARCH_TEXT_MAX_CHARS, acotando los tokens de entrada.
+        """
+        blocks = [
+            f"**Búsqueda**: {query}\n"
+            f"**Fuente**: {title or 'N/A'}\n"
+            f"**Contenido**: {content[:RESEARCH_RESULT_MAX_CHARS]}\n"
+            f"**URL**: {url or 'N/A'}\n"
+            for query, title, content, url in map(_RESULT_FIELDS, research_results)
+        ]
+
+        formatted_results = []
+        total_chars = 0
+        for block in blocks:
+            if formatted_results and total_chars + len(block) > RESEARCH_TEXT_MAX_CHARS:
+                break
+            formatted_results.append(block)
+            total_chars += len(block)
+
+        research_text = "\n---\n".join(formatted_results)
+        logger.info(f"research_text: {len(research_text)} chars, {len(formatted_results)}/{len(research_results)} results used")
+        return research_text
+
     def analyze_opportunities(self, business_info: Dict[str, Any], research_results: List[Dict[str, str]]) -> str:
         """Analiza los resultados y genera recomendaciones."""
         try:
-            # Formatear los resultados de investigación
-            formatted_results = []
-            for result in research_results:
-                formatted_results.append(
-                    f"**Búsqueda**: {result['query']}\n"
-                    f"**Fuente**: {result.get('title', 'N/A')}\n"
-                    f"**Contenido**: {result['content']}\n"
-                    f"**URL**: {result.get('url', 'N/A')}\n"
-                )
-            
-            research_text = "\n---\n".join(formatted_results)
-            
-            prompt = ChatPromptTemplate.from_template(ANALYSIS_PROMPT)
-            chain = prompt | self.llm
-            
-            response = chain.invoke({
-                "business_info": str(business_info),
-                "research_results": research_text
+            response = self.analysis_chain.invoke({
+                "business_info": stable_json(business_info),
+                "research_results": self._format_research_results(research_results)
             })
             
             return response.content
@@ -156,6 +249,137 @@ class ResearchAgent:
             logger.error(f"Error en análisis de oportunidades: {str(e)}")
             return "Hubo un error analizando las oportunidades encontradas."
 
+    async def aanalyze_opportunities(self, business_info: Dict[str, Any], research_results: List[Dict[str, str]]) -> str:
+        """
+        Versión asíncrona de analyze_opportunities.
+        Usa ainvoke y no astream: astream no consulta la caché del LLM. Con
+        stream_mode="messages" el modelo transmite igualmente los tokens cuando
+        no hay acierto de caché.
+        """
+        try:
+            response = await self.analysis_chain.ainvoke({
+                "business_info": stable_json(business_info),
+                "research_results": self._format_research_results(research_results)
+            })
+            return response.content
+
+        except Exception as e:
+            logger.error(f"Error en análisis de oportunidades: {str(e)}")
+            return "Hubo un error analizando las oportunidades encontradas."
+
+
+@lru_cache
+def get_research_agent() -> ResearchAgent:
+    """Get the shared ResearchAgent (it holds no per-request state)."""
+    return ResearchAgent()
+
+
+def _business_info_key(business_info: Dict[str, Any]) -> str:
+    """Huella estable de business_info."""
+    return hashlib.blake2b(stable_json(business_info).encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Investigaciones especulativas pendientes de consumir, por huella de business_info
+_speculative_research = TTLCache(maxsize=256, ttl=RESEARCH_CACHE_TTL)
+_research_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-research")
+
+
+def _run_research(business_info: Dict[str, Any], follow_up: str = "") -> Tuple[List[Dict[str, str]], str]:
+    """Consultas, búsquedas y análisis para business_info (y la solicitud de seguimiento, si la hay)."""
+    research_agent = get_research_agent()
+
+    # Generar consultas de búsqueda
+    queries = research_agent.generate_search_queries(business_info, follow_up)
+    logger.info(f"Consultas generadas: {queries}")
+
+    # Realizar búsquedas
+    research_results = research_agent.search_opportunities(queries)
+
+    # Analizar resultados
+    analysis = research_agent.analyze_opportunities(business_info, research_results)
+    return research_results, analysis
+
+
+async def _arun_research(business_info: Dict[str, Any], follow_up: str = "") -> Tuple[List[Dict[str, str]], str]:
+    """Versión asíncrona de _run_research: ninguna llamada bloquea el event loop."""
+    research_agent = get_research_agent()
+
+    if not RESEARCH_SPECULATIVE_SEARCH:
+        queries = await research_agent.agenerate_search_queries(business_info, follow_up)
+        logger.info(f"Consultas generadas: {queries}")
+        research_results = await research_agent.asearch_opportunities(queries)
+    else:
+        # Búsqueda especulativa: las consultas genéricas se buscan mientras el LLM genera
+        # las suyas; si coinciden (p. ej. el LLM falló) la latencia del LLM queda oculta
+        fallback_queries = research_agent._fallback_queries(business_info)
+        fallback_task = asyncio.create_task(research_agent.asearch_opportunities(fallback_queries))
+
+        queries = await research_agent.agenerate_search_queries(business_info, follow_up)
+        logger.info(f"Consultas generadas: {queries}")
+
+        if set(queries) == set(fallback_queries):
+            research_results = await fallback_task
+        else:
+            fallback_task.cancel()
+            research_results = await research_agent.asearch_opportunities(queries)
+
+    analysis = await research_agent.aanalyze_opportunities(business_info, research_results)
+    return research_results, analysis
+
+
+def start_speculative_research(business_info: Dict[str, Any]) -> None:
+    """
+    Lanza la investigación en segundo plano mientras el usuario valida su información.
+    Si la valida sin cambios, research_opportunities_node consume el resultado (una sola vez);
+    si la corrige, se descarta con discard_speculative_research.
+    """
+    key = _business_info_key(business_info)
+    # Ya lanzada y sin consumir (p. ej. el nodo se re-ejecuta al reanudar tras interrupt)
+    if _speculative_research.get(key) is not None:
+        return
+
+    logger.info("Iniciando investigación especulativa")
+    future = _research_executor.submit(_run_research, dict(business_info))
+    _speculative_research.set(key, future)
+    future.add_done_callback(lambda done: _discard_failed_research(key, done))
+
+
+def discard_speculative_research(business_info: Dict[str, Any]) -> None:
+    """Descarta la investigación especulativa de business_info y la cancela si aún no empezó."""
+    future = _speculative_research.pop(_business_info_key(business_info))
+    if future is not None and future.cancel():
+        logger.info("Investigación especulativa cancelada")
+
+
+def _discard_failed_research(key: str, future: Future) -> None:
+    """Una investigación especulativa fallida no se conserva: el nodo la ejecutará de nuevo."""
+    if (future.cancelled() or future.exception() is not None) and _speculative_research.get(key) is future:
+        _speculative_research.pop(key)
+
+
+def _follow_up_request(state: PYMESState) -> str:
+    """Solicitud del usuario cuando vuelve a la investigación pidiendo más información."""
+    return get_last_user_input(state) if state.get("stage") == "research_followup" else ""
+
+
+def _research_update(business_info: Dict[str, Any], research_results: List[Dict[str, str]], analysis: str) -> Dict[str, Any]:
+    """Actualización del estado con el análisis de oportunidades."""
+    return {
+        "web_search": f"Investigación completada con {len(research_results)} resultados",
+        "context": analysis,
+        "stage": "research_completed",
+        "messages": [AIMessage(content=f"🔍 **INVESTIGACIÓN COMPLETADA**\n\nHe analizado las oportunidades para tu negocio **{business_info.get('nombre_empresa', 'N/A')}**.\n\n{analysis}")]
+    }
+
+
+def _error_update(content: str) -> Dict[str, Any]:
+    """Actualización de error; el AIMessage se crea en cada llamada para que add_messages le asigne un id propio."""
+    return {"messages": [AIMessage(content=content)], "stage": "error"}
+
+
+_NO_BUSINESS_INFO_MESSAGE = "No tengo información suficiente del negocio para realizar la investigación."
+_RESEARCH_ERROR_MESSAGE = "Hubo un error durante la investigación. Intentaré nuevamente."
+
 
 def research_opportunities_node(state: PYMESState) -> Dict[str, Any]:
     """
@@ -167,36 +391,76 @@ def research_opportunities_node(state: PYMESState) -> Dict[str, Any]:
         business_info = state.get("business_info", {})
         if not business_info:
             logger.warning("No hay información del negocio disponible para investigar")
-            return {
-                "messages": [AIMessage(content="No tengo información suficiente del negocio para realizar la investigación.")],
-                "stage": "error"
-            }
-        
-        research_agent = ResearchAgent()
-        
-        # Generar consultas de búsqueda
-        queries = research_agent.generate_search_queries(business_info)
-        logger.info(f"Consultas generadas: {queries}")
+            return _error_update(_NO_BUSINESS_INFO_MESSAGE)
         
-        # Realizar búsquedas
-        research_results = research_agent.search_opportunities(queries)
-        
-        # Analizar resultados
-        analysis = research_agent.analyze_opportunities(business_info, research_results)
+        follow_up = _follow_up_request(state)
+        if follow_up:
+            # "Más información": nueva investigación guiada por la solicitud del usuario
+            research_results, analysis = _run_research(business_info, follow_up)
+        else:
+            # Reutilizar la investigación especulativa si se lanzó con esta misma información
+            speculative: Future = _speculative_research.pop(_business_info_key(business_info))
+            try:
+                research_results, analysis = speculative.result() if speculative else _run_research(business_info)
+            except Exception as e:
+                logger.warning(f"Investigación especulativa fallida, se repite: {str(e)}")
+                research_results, analysis = _run_research(business_info)
         
-        return {
-            "web_search": f"Investigación completada con {len(research_results)} resultados",
-            "context": analysis,
-            "stage": "research_completed",
-            "messages": [AIMessage(content=f"🔍 **INVESTIGACIÓN COMPLETADA**\n\nHe analizado las oportunidades para tu negocio **{business_info.get('nombre_empresa', 'N/A')}**.\n\n{analysis}")]
-        }
+        return _research_update(business_info, research_results, analysis)
         
     except Exception as e:
         logger.error(f"Error en research_opportunities_node: {str(e)}")
-        return {
-            "messages": [AIMessage(content="Hubo un error durante la investigación. Intentaré nuevamente.")],
-            "stage": "error"
-        }
+        return _error_update(_RESEARCH_ERROR_MESSAGE)
+
+
+async def aresearch_opportunities_node(state: PYMESState) -> Dict[str, Any]:
+    """
+    Versión asíncrona de research_opportunities_node: consultas, búsquedas y
+    análisis (en streaming) sin bloquear el event loop.
+    """
+    try:
+        logger.info("Iniciando investigación de oportunidades (async)")
+
+        business_info = state.get("business_info", {})
+        if not business_info:
+            logger.warning("No hay información del negocio disponible para investigar")
+            return _error_update(_NO_BUSINESS_INFO_MESSAGE)
+
+        follow_up = _follow_up_request(state)
+        if follow_up:
+            research_results, analysis = await _arun_research(business_info, follow_up)
+        else:
+            speculative: Future = _speculative_research.pop(_business_info_key(business_info))
+            try:
+                if speculative:
+                    research_results, analysis = await asyncio.wrap_future(speculative)
+                else:
+                    research_results, analysis = await _arun_research(business_info)
+            except Exception as e:
+                logger.warning(f"Investigación especulativa fallida, se repite: {str(e)}")
+                research_results, analysis = await _arun_research(business_info)
+
+        return _research_update(business_info, research_results, analysis)
+
+    except Exception as e:
+        logger.error(f"Error en research_opportunities_node: {str(e)}")
+        return _error_update(_RESEARCH_ERROR_MESSAGE)
+
+
+# Nodo con entrada síncrona y asíncrona: invoke usa la primera, ainvoke/astream la segunda
+research_opportunities_runnable = RunnableLambda(research_opportunities_node, afunc=aresearch_opportunities_node)
+
+
+# Respuestas a la validación de la investigación
+_PLAN_REPLIES = frozenset({"sí", "si", "yes", "generar plan", "plan de acción"})
+_MORE_RESEARCH_RE = re.compile(r"más información|investigación", re.IGNORECASE)
+
+# Destino tras la validación -> cambios de etapa que lo acompañan
+_RESEARCH_VALIDATION_UPDATES = {
+    "generate_growth_plan": {"stage": "plan_generation"},
+    "research_opportunities": {"stage": "research_followup"},
+    "generate_response": {"stage": "conversation"},
+}
 
 
 def validate_research_results_node(state: PYMESState) -> Command:
@@ -235,36 +499,25 @@ Responde:
         
         logger.info(f"Respuesta del usuario: {user_response}")
         
-        response_lower = user_response.lower().strip()
-        
-        if response_lower in ["sí", "si", "yes", "generar plan", "plan de acción"]:
-            return Command(
-                update={
-                    "stage": "plan_generation",
-                    "messages": [HumanMessage(content=user_response)]
-                },
-                goto="generate_growth_plan"
-            )
-        
-        elif "más información" in response_lower or "investigación" in response_lower:
-            return Command(
-                update={
-                    "messages": [HumanMessage(content=user_response)]
-                },
-                goto="research_opportunities"
-            )
-        
+        if user_response.strip().lower() in _PLAN_REPLIES:
+            goto = "generate_growth_plan"
+        elif _MORE_RESEARCH_RE.search(user_response):
+            goto = "research_opportunities"
         else:
             # Respuesta general o pregunta - continuar conversación
-            return Command(
-                update={
-                    "input": user_response,
-                    "messages": [HumanMessage(content=user_response)],
-                    "stage": "conversation"
-                },
-                goto="generate_response"  # Ir al nodo de conversación general
-            )
+            goto = "generate_response"
+
+        return Command(
+            update={
+                **human_message_update(state, user_response),
+                **_RESEARCH_VALIDATION_UPDATES[goto]
+            },
+            goto=goto
+        )
             
+    except GraphInterrupt:
+        # interrupt() pausa el grafo lanzando GraphInterrupt: no es un error
+        raise
     except Exception as e:
         logger.error(f"Error en validate_research_results_node: {str(e)}")
         return Command(
@@ -284,7 +537,7 @@ def create_research_subgraph():
         workflow = StateGraph(PYMESState)
         
         # Agregar nodos
-        workflow.add_node("research_opportunities", research_opportunities_node)
+        workflow.add_node("research_opportunities", research_opportunities_runnable)
         workflow.add_node("validate_research_results", validate_research_results_node)
         
         # Definir flujo
@@ -3,7 +3,7 @@ from typing_extensions import TypedDict
 from operator import add
 
 from langchain_core.documents import Document
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, HumanMessage
 from langgraph.graph import add_messages
 from pydantic import BaseModel
 
@@ -52,8 +52,9 @@ class PYMESState(TypedDict):
 
     # Entrada actual del usuario
     input: Optional[str]
+    last_human_idx: Optional[int]  # Índice del último HumanMessage en messages
     answer: Optional[str]
-    feedback: List[str]
+    feedback: Annotated[List[str], add]  # Reducer: los nodos devuelven solo la nueva entrada
 
     # Información del negocio
     business_info: Optional[BusinessInfo]
@@ -75,3 +76,81 @@ class PYMESState(TypedDict):
     # Multi-agent state
     current_agent: Optional[str]  # Agente activo actual
     last_handoff: Optional[str]   # Última descripción de handoff
+
+
+def human_message_update(state: PYMESState, content: str) -> Dict[str, Any]:
+    """
+    Update parcial que añade un HumanMessage y guarda su índice.
+    add_messages lo agrega al final, así que su posición es la longitud actual.
+    """
+    return {
+        "messages": [HumanMessage(content=content)],
+        "last_human_idx": len(state.get("messages") or [])
+    }
+
+
+def get_last_human_index(state: Dict[str, Any]) -> Optional[int]:
+    """Devuelve la posición (no negativa) del último HumanMessage usando el índice guardado en el estado."""
+    messages = state.get("messages") or []
+    idx = state.get("last_human_idx")
+
+    # Camino rápido O(1): el índice apunta al mensaje del usuario
+    if idx is not None and -len(messages) <= idx < len(messages) and isinstance(messages[idx], HumanMessage):
+        return idx % len(messages)
+
+    # Fallback: el índice no existe o quedó desfasado (p. ej. mensajes eliminados)
+    return next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+
+
+def get_last_human_message(state: PYMESState) -> Optional[HumanMessage]:
+    """Devuelve el último HumanMessage usando el índice guardado en el estado."""
+    idx = get_last_human_index(state)
+    return state["messages"][idx] if idx is not None else None
+
+
+def get_last_user_input(state: PYMESState) -> str:
+    """
+    Texto del último mensaje del usuario.
+    Se lee del último HumanMessage (los nodos de feedback ya no duplican el texto
+    en 'input'); 'input' solo se usa si aún no hay mensajes.
+    """
+    last_message = get_last_human_message(state)
+    if last_message is not None:
+        return last_message.content
+    return state.get("input") or ""
+
+
+# === Respuestas triviales del usuario (única definición para grafos y servicios) ===
+
+# Cierran la conversación en los nodos de feedback
+TERMINATION_WORDS = frozenset({
+    "done", "thanks", "bye", "adios", "adiós", "terminate", "exit", "gracias", "chau", "chao", "fin"
+})
+# Acuses de recibo que el consultor responde sin invocar al agente.
+# "sí"/"no" quedan fuera: suelen responder a una pregunta del consultor.
+ACKNOWLEDGEMENT_WORDS = frozenset({
+    "ok", "oki", "okay", "gracias", "muchas gracias", "vale", "listo", "perfecto", "👍", "✅"
+})
+# Respuestas que nunca contienen información empresarial: no justifican una extracción.
+# No se usa un umbral de longitud: "Lima" o "Restaurante" son respuestas válidas.
+NO_DATA_REPLIES = TERMINATION_WORDS | ACKNOWLEDGEMENT_WORDS | {"sí", "si", "no", "continuar", "siguiente"}
+
+
+def normalize_reply(text: str) -> str:
+    """Forma canónica de una respuesta corta: sin mayúsculas, espacios repetidos ni '!'/'.' finales."""
+    return " ".join(text.casefold().split()).rstrip("!. ")
+
+
+def is_termination_reply(text: str) -> bool:
+    """True si el usuario quiere terminar la conversación."""
+    return normalize_reply(text) in TERMINATION_WORDS
+
+
+def is_acknowledgement(text: str) -> bool:
+    """True para un acuse de recibo sin pregunta ni contenido."""
+    return normalize_reply(text) in ACKNOWLEDGEMENT_WORDS
+
+
+def is_no_data_reply(text: str) -> bool:
+    """True si la respuesta no puede aportar información del negocio."""
+    return normalize_reply(text) in NO_DATA_REPLIES
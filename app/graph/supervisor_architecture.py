@@ -1,22 +1,89 @@
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import json
 import logging
+import re
+import threading
 import time
+import weakref
 from typing import Dict, Any, List, Literal, Annotated, Optional
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.tools import tool
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage, messages_to_dict
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool, tool
 from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph, START, END, MessagesState
+from langgraph.config import get_config, get_store
+from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import create_react_agent, InjectedState
+from langgraph.prebuilt.chat_agent_executor import AgentState
 from langgraph.types import Command, interrupt
 from pydantic import BaseModel, Field
 
-from app.config.settings import LLM_MODEL
-from app.graph.state import PYMESState
+from app.config.settings import (
+    LLM_MODEL, HISTORY_WINDOW, SEMANTIC_CACHE_ENABLED, EXTRACTION_TIMEOUT, EXTRACTION_MAX_CONCURRENCY,
+    EXTRACTION_CACHE_TTL, EXTRACTION_CACHE_MAX_ENTRIES, STATE_MAX_MESSAGES, STATE_KEEP_MESSAGES
+)
+from app.graph.state import (
+    PYMESState,
+    get_last_human_index,
+    get_last_human_message,
+    get_last_user_input,
+    is_acknowledgement,
+    is_no_data_reply,
+    is_termination_reply
+)
 from app.services.memory_service import get_memory_service
-from app.services.business_info_manager import get_business_info_manager
+from app.services.business_info_manager import get_business_info_manager, compact_business_info
+from app.services.response_cache import get_response_cache
+from app.utils.async_utils import run_coroutine_sync
+from app.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Claves del PYMESState que realmente lee un agente ReAct; el resto no se envía
+_AGENT_INPUT_KEYS = ("messages", "business_info", "last_human_idx")
+
+
+class PYMESAgentState(AgentState):
+    """Estado de los agentes ReAct: mensajes + información del negocio para el contexto."""
+    business_info: Dict[str, Any]
+    last_human_idx: Optional[int]
+
+
+def _agent_input(state: PYMESState) -> Dict[str, Any]:
+    """Recorta el estado a las claves que necesita create_react_agent."""
+    return {key: state[key] for key in _AGENT_INPUT_KEYS if key in state}
+
+
+def _new_agent_messages(state: PYMESState, result: Dict[str, Any]) -> List:
+    """
+    Messages produced by the agent in this call. The agent echoes the input history
+    first, so the new ones are the tail; returning only them keeps the add_messages
+    merge proportional to the turn, not to the whole conversation.
+    """
+    return result["messages"][len(state.get("messages") or []):]
+
+# Respuesta a los acuses de recibo triviales (ACKNOWLEDGEMENT_WORDS)
+_ACK_REPLY = "¡Con gusto! 😊 ¿Hay algo más en lo que pueda ayudarte con tu negocio?"
+
+
+def _safe_agent_node(fallback_message: str):
+    """Decorador que captura errores de un nodo agente y responde con un mensaje de respaldo."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(state: PYMESState) -> Dict[str, Any]:
+            try:
+                return func(state)
+            except Exception as e:
+                logger.error("Error in %s: %s", func.__name__, e)
+                return {
+                    "messages": [AIMessage(content=fallback_message)],
+                    "answer": fallback_message
+                }
+        return wrapper
+    return decorator
+
 
 # === MODELOS PYDANTIC PARA STRUCTURED OUTPUT ===
 
@@ -40,67 +107,101 @@ class BusinessInfoExtracted(BaseModel):
 
 # === NODOS SIGUIENDO EL PATRÓN DE REFERENCIA ===
 
-def business_info_extraction_node(state: PYMESState) -> Dict[str, Any]:
-    """Extract and store important business information from the last message."""
-    logger.info("🚀 business_info_extraction_node iniciado")
-    
+# Un semáforo por event loop (grafo síncrono -> loop de fondo; ainvoke -> loop de la app)
+_extraction_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_extraction_semaphore() -> asyncio.Semaphore:
+    """Semaphore bounding concurrent extractions on the running loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _extraction_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _extraction_semaphores[loop] = asyncio.Semaphore(EXTRACTION_MAX_CONCURRENCY)
+    return semaphore
+
+
+# Mensajes de usuario ya extraídos (thread, huella del mensaje): una re-entrada no repite el LLM
+_extracted_messages = TTLCache(maxsize=EXTRACTION_CACHE_MAX_ENTRIES, ttl=EXTRACTION_CACHE_TTL)
+
+
+def _message_fingerprint(message) -> str:
+    """Id del mensaje, o sha256 de su contenido si no tiene id."""
+    return message.id or hashlib.sha256(str(message.content).encode("utf-8")).hexdigest()
+
+
+async def _extract_business_info(state: PYMESState) -> Dict[str, Any]:
+    """Run the BusinessInfoManager on the last user message and return the state update."""
     if not state.get("messages"):
         logger.warning("⚠️ No hay mensajes en el estado")
         return {}
 
     # Obtener thread_id del estado
     thread_id = get_thread_id_from_state(state)
-    logger.info(f"🔗 Thread ID obtenido: {thread_id}")
+    logger.info("🔗 Thread ID obtenido: %s", thread_id)
 
     business_info_manager = get_business_info_manager()
     current_info = state.get("business_info", {})
-    last_message = state["messages"][-1]
-    
-    logger.info(f"📥 Estado business_info ANTES de extracción: {current_info}")
-    logger.info(f"💬 Procesando mensaje: {last_message.content[:100]}...")
-    
-    # Ejecutar función async de manera robusta
-    import asyncio
+    last_message = get_last_human_message(state)
+    if last_message is None:
+        logger.warning("⚠️ No hay mensajes del usuario en el estado")
+        return {}
+
+    # Despedidas y acuses de recibo no aportan datos del negocio: sin llamada al LLM
+    if is_no_data_reply(last_message.content):
+        logger.info("⏭️ Mensaje trivial, se omite la extracción")
+        return {}
+
+    # Mensaje ya procesado (p. ej. el evaluador ya extrajo en este mismo turno)
+    extraction_key = (thread_id, _message_fingerprint(last_message))
+    if _extracted_messages.get(extraction_key):
+        logger.info("⏭️ Mensaje ya extraído, se reutiliza la información del estado")
+        return {}
+
+    logger.info("📥 Estado business_info ANTES de extracción: %s", current_info)
+    logger.info("💬 Procesando mensaje: %s...", last_message.content[:100])
+
     try:
-        # Intentar ejecutar la función async
-        try:
-            # Primero intentar obtener el loop actual
-            loop = asyncio.get_running_loop()
-            # Si hay un loop corriendo, usar ThreadPoolExecutor
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(
-                    asyncio.run,
-                    business_info_manager.extract_and_store_business_info(
-                        last_message, current_info, thread_id
-                    )
-                )
-                updated_info = future.result()
-        except RuntimeError:
-            # No hay loop corriendo, usar asyncio.run directamente
-            updated_info = asyncio.run(
-                business_info_manager.extract_and_store_business_info(
-                    last_message, current_info, thread_id
-                )
+        # Concurrencia acotada y tiempo máximo: una llamada colgada no bloquea el turno
+        async with _get_extraction_semaphore():
+            updated_info = await asyncio.wait_for(
+                business_info_manager.extract_and_store_business_info(last_message, current_info, thread_id),
+                timeout=EXTRACTION_TIMEOUT
             )
+        _extracted_messages.set(extraction_key, True)
+    except asyncio.TimeoutError:
+        logger.warning("⏱️ Extracción superó %ss, se mantiene la información actual", EXTRACTION_TIMEOUT)
+        updated_info = current_info
     except Exception as async_error:
-        logger.error(f"Error ejecutando función async: {async_error}")
+        logger.error("Error ejecutando función async: %s", async_error)
         # En caso de error, devolver la información actual sin cambios
         updated_info = current_info
-    
-    logger.info(f"📤 Estado business_info DESPUÉS de extracción: {updated_info}")
-    
+
+    logger.info("📤 Estado business_info DESPUÉS de extracción: %s", updated_info)
+
     # Verificar si hubo cambios
     if updated_info != current_info:
         logger.info("✅ ESTADO BUSINESS_INFO ACTUALIZADO - Devolviendo cambios al grafo")
     else:
         logger.info("ℹ️ No hubo cambios en business_info")
-    
+
     result = {"business_info": updated_info}
-    logger.info(f"🔄 Devolviendo al grafo: {result}")
-    
+    logger.info("🔄 Devolviendo al grafo: %s", result)
+
     return result
 
+
+async def business_info_extraction_node(state: PYMESState) -> Dict[str, Any]:
+    """Extract and store important business information from the last message."""
+    logger.info("🚀 business_info_extraction_node iniciado")
+    return await _extract_business_info(state)
+
+
+def business_info_extraction_node_sync(state: PYMESState) -> Dict[str, Any]:
+    """Sync shim for business_info_extraction_node (runs on the shared background loop)."""
+    return run_coroutine_sync(business_info_extraction_node(state))
+
 def business_info_injection_node(state: PYMESState) -> Dict[str, Any]:
     """Retrieve and inject relevant business information into the context."""
     business_info_manager = get_business_info_manager()
@@ -115,77 +216,82 @@ def business_info_injection_node(state: PYMESState) -> Dict[str, Any]:
 
 # === FUNCIONES AUXILIARES ===
 
-def business_info_evaluator_node(state: PYMESState) -> Dict[str, Any]:
+# Namespace del store donde se archiva el historial antiguo de cada thread
+HISTORY_NAMESPACE = "history"
+
+
+async def _archive_old_messages(state: PYMESState) -> Dict[str, Any]:
+    """
+    Move the oldest messages to the graph store once the thread exceeds STATE_MAX_MESSAGES.
+    Only the last STATE_KEEP_MESSAGES stay in the checkpoint, so its size stays bounded.
+    """
+    messages = state.get("messages") or []
+    if len(messages) <= STATE_MAX_MESSAGES:
+        return {}
+
+    # El tramo conservado empieza en un mensaje del usuario: no quedan ToolMessages huérfanos
+    cut = len(messages) - STATE_KEEP_MESSAGES
+    while cut < len(messages) and not isinstance(messages[cut], HumanMessage):
+        cut += 1
+    if cut >= len(messages):
+        return {}
+
+    evicted = messages[:cut]
+    thread_id = get_thread_id_from_state(state)
+    try:
+        # Clave con marca de tiempo: los bloques se recuperan en orden
+        await get_store().aput(
+            (HISTORY_NAMESPACE, thread_id),
+            f"{time.time_ns():020d}",
+            {"messages": messages_to_dict(evicted)}
+        )
+    except Exception as e:
+        logger.error("Error archivando historial de %s: %s", thread_id, e)
+        return {}
+
+    logger.info("🗄️ %d mensajes archivados en el store para %s", len(evicted), thread_id)
+    update: Dict[str, Any] = {"messages": [RemoveMessage(id=m.id) for m in evicted]}
+    last_human_idx = state.get("last_human_idx")
+    if last_human_idx is not None:
+        update["last_human_idx"] = last_human_idx - cut if last_human_idx >= cut else None
+    return update
+
+
+async def business_info_evaluator_node(state: PYMESState) -> Dict[str, Any]:
     """
     Simple business info extraction node following the reference pattern.
     Replaces the complex evaluator with the simple extraction pattern.
+    Also archives the long tail of the conversation (see _archive_old_messages)
+    and picks the next agent with the supervisor rules on the updated info.
     """
     try:
         logger.info("🔍 business_info_evaluator_node activado")
-        
-        # Obtener estado actual para logging
-        current_business_info = state.get("business_info", {})
-        logger.info(f"📊 Estado business_info al INICIO del evaluador: {current_business_info}")
-        
-        # Obtener thread_id del estado
-        thread_id = get_thread_id_from_state(state)
-        logger.info(f"🔗 Thread ID obtenido: {thread_id}")
+        update = await _extract_business_info(state)
 
-        if not state.get("messages"):
-            logger.warning("⚠️ No hay mensajes en el estado")
-            return {}
-
-        # Usar el BusinessInfoManager directamente (sin async)
-        business_info_manager = get_business_info_manager()
-        last_message = state["messages"][-1]
-        
-        logger.info(f"💬 Procesando mensaje: {last_message.content[:100]}...")
-        
-        # Ejecutar función async de manera robusta
-        import asyncio
-        try:
-            # Intentar ejecutar la función async
-            try:
-                # Primero intentar obtener el loop actual
-                loop = asyncio.get_running_loop()
-                # Si hay un loop corriendo, usar ThreadPoolExecutor
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(
-                        asyncio.run,
-                        business_info_manager.extract_and_store_business_info(
-                            last_message, current_business_info, thread_id
-                        )
-                    )
-                    updated_info = future.result()
-            except RuntimeError:
-                # No hay loop corriendo, usar asyncio.run directamente
-                updated_info = asyncio.run(
-                    business_info_manager.extract_and_store_business_info(
-                        last_message, current_business_info, thread_id
-                    )
-                )
-        except Exception as async_error:
-            logger.error(f"Error ejecutando función async: {async_error}")
-            # En caso de error, devolver la información actual sin cambios
-            updated_info = current_business_info
-        
-        logger.info(f"📤 Estado business_info DESPUÉS de extracción: {updated_info}")
-        
-        # Verificar si hubo cambios
-        if updated_info != current_business_info:
-            logger.info("✅ EVALUADOR CONFIRMÓ CAMBIOS EN BUSINESS_INFO")
-        else:
-            logger.info("ℹ️ Evaluador no detectó cambios")
-        
-        result = {"business_info": updated_info}
-        logger.info(f"🔄 Devolviendo al grafo: {result}")
-        
-        return result
-        
     except Exception as e:
-        logger.error(f"Error in business info extraction: {str(e)}")
-        return {}
+        logger.error("Error in business info extraction: %s", e)
+        update = {}
+
+    update.update(await _archive_old_messages(state))
+
+    # Routing happens in this same step (it used to be a separate supervisor node):
+    # one superstep and one checkpoint write less per turn
+    routing_state = dict(state)
+    routing_state["business_info"] = update.get("business_info", state.get("business_info"))
+    routing = supervisor_node(routing_state)
+    if "messages" in routing:
+        routing["messages"] = update.get("messages", []) + routing["messages"]
+    update.update(routing)
+    return update
+
+
+def business_info_evaluator_node_sync(state: PYMESState) -> Dict[str, Any]:
+    """
+    Sync shim for business_info_evaluator_node.
+    The graph is also invoked synchronously (PostgresSaver), so the coroutine is
+    awaited on the shared background loop instead of a fresh thread + event loop.
+    """
+    return run_coroutine_sync(business_info_evaluator_node(state))
 
 
 def get_thread_id_from_state(state: PYMESState) -> str:
@@ -193,12 +299,24 @@ def get_thread_id_from_state(state: PYMESState) -> str:
     # Try to get from different sources
     thread_id = state.get("thread_id")
 
+    if not thread_id:
+        # The graph's own thread_id, when running inside a graph
+        try:
+            thread_id = get_config().get("configurable", {}).get("thread_id")
+        except RuntimeError:
+            thread_id = None
+
     if not thread_id:
         messages = state.get("messages", [])
         for msg in messages:
             if hasattr(msg, 'additional_kwargs') and msg.additional_kwargs.get('thread_id'):
                 return msg.additional_kwargs['thread_id']
 
+        # Stable fallback: hash of the first message of the conversation
+        if messages:
+            digest = hashlib.blake2b(str(messages[0].content).encode("utf-8"), digest_size=8).hexdigest()
+            return f"temp_{digest}"
+
     return thread_id or f"temp_{int(time.time())}"
 
 
@@ -211,6 +329,13 @@ def extract_business_info_from_conversation(messages: List, current_state: PYMES
     return current_state.get("business_info", {})
 
 
+# Indicadores de investigación (palabra completa: "market" no coincide con "marketing")
+_RESEARCH_RE = re.compile(
+    r"\b(research|analysis|opportunities|trends|market|investigación|análisis|oportunidades|tendencias|mercado)\b",
+    re.IGNORECASE
+)
+
+
 def extract_research_from_messages(messages: List) -> str:
     """Extract research content from the messages."""
     try:
@@ -219,46 +344,54 @@ def extract_research_from_messages(messages: List) -> str:
             if isinstance(msg, AIMessage) and msg.content:
                 content = msg.content
                 # Search for research indicators
-                if any(keyword in content.lower() for keyword in
-                       ["research", "analysis", "opportunities", "trends", "market"]):
+                if _RESEARCH_RE.search(content):
                     research_content += content + "\n"
 
         return research_content.strip() if research_content else None
 
     except Exception as e:
-        logger.error(f"Error extracting research: {str(e)}")
+        logger.error("Error extracting research: %s", e)
         return None
 
 
 # === HANDOFF TOOLS BETWEEN AGENTS ===
 
-def create_handoff_tool(*, agent_name: str, description: str | None = None):
-    """Creates a handoff tool following the LangGraph pattern."""
-    name = f"transfer_to_{agent_name}"
-    description = description or f"Transfer control to {agent_name} agent."
-
-    @tool(name, description=description)
-    def handoff_tool(
-            task_description: Annotated[
-                str,
-                "Description of what the next agent should do, including all relevant context.",
-            ],
-            state: Annotated[PYMESState, InjectedState],
-    ) -> Command:
+class HandoffInput(BaseModel):
+    """Input schema shared by every handoff tool."""
+    task_description: str = Field(
+        description="Description of what the next agent should do, including all relevant context."
+    )
+    state: Annotated[Dict[str, Any], InjectedState]
+
+
+class HandoffTool(BaseTool):
+    """Handoff tool following the LangGraph pattern; one instance per target agent."""
+
+    agent_name: str
+    args_schema: type[BaseModel] = HandoffInput
+
+    def _run(self, task_description: str, state: Dict[str, Any], **kwargs: Any) -> Command:
         """Execute handoff to the specified agent."""
         # Create task message for the next agent
-        task_message = AIMessage(content=f"Transferring to {agent_name}: {task_description}")
+        task_message = AIMessage(content=f"Transferring to {self.agent_name}: {task_description}")
 
         return Command(
-            goto=agent_name,
+            goto=self.agent_name,
             update={
                 "messages": [task_message],
-                "current_agent": agent_name,
+                "current_agent": self.agent_name,
                 "last_handoff": task_description
             }
         )
 
-    return handoff_tool
+
+def create_handoff_tool(*, agent_name: str, description: str | None = None) -> HandoffTool:
+    """Creates a handoff tool following the LangGraph pattern."""
+    return HandoffTool(
+        agent_name=agent_name,
+        name=f"transfer_to_{agent_name}",
+        description=description or f"Transfer control to {agent_name} agent."
+    )
 
 
 # Create specific handoff tools
@@ -277,6 +410,13 @@ transfer_to_consultant = create_handoff_tool(
     description="Transfer to the conversational consultant for general questions, specific doubts, or fluid business conversation."
 )
 
+# Handoff tools available to each agent, built once and shared (tuples are immutable)
+AGENT_HANDOFF_TOOLS: Dict[str, tuple] = {
+    "info_extractor": (transfer_to_researcher, transfer_to_consultant),
+    "researcher": (transfer_to_consultant, transfer_to_info_extractor),
+    "consultant": (transfer_to_info_extractor, transfer_to_researcher),
+}
+
 
 @tool
 def get_business_info_status():
@@ -363,6 +503,7 @@ AVAILABLE TOOLS:
 - transfer_to_consultant: For conversation about results
 - transfer_to_info_extractor: If you need more business information
 
+Use the available business information to generate specific and relevant research.
 When presenting results, be specific and practical. Ask the user if they want to delve deeper into a specific area.
 """
 
@@ -386,24 +527,57 @@ You are empathetic, practical, and results-oriented. Always seek to be useful an
 """
 
 
+def _business_context_message(business_info: Dict[str, Any]) -> SystemMessage:
+    """Mensaje corto con los datos del negocio, separado del prompt de sistema."""
+    return SystemMessage(
+        content=f"AVAILABLE BUSINESS INFORMATION: {json.dumps(compact_business_info(business_info), ensure_ascii=False)}"
+    )
+
+
+def _with_business_context(system_prompt: str):
+    """
+    Build a ReAct prompt that keeps the system prompt byte-identical across calls
+    (provider prompt caching) and injects business_info as a separate message
+    just before the last user turn.
+    """
+    system_message = SystemMessage(content=system_prompt)
+
+    def prompt(state: PYMESAgentState) -> List:
+        messages = list(state["messages"])
+        business_info = state.get("business_info")
+        if business_info:
+            last_human_idx = get_last_human_index(state)
+            messages.insert(len(messages) if last_human_idx is None else last_human_idx,
+                            _business_context_message(business_info))
+        return [system_message, *messages]
+
+    return prompt
+
+
 # === STATE FUNCTIONS ===
 
+# Campos mínimos para poder iniciar la investigación
+_CRITICAL_FIELDS = ("nombre_empresa", "sector", "productos_servicios_principales", "ubicacion")
+
+# Completitud y estado indexados por número de campos críticos faltantes (dominio finito: 0..4)
+_COMPLETENESS_BY_MISSING = (1.0, 0.75, 0.5, 0.25, 0.0)
+_STATUS_BY_MISSING = ("Complete", "Partial", "Partial", "Partial", "Missing")
+
+
+def get_missing_critical_fields(business_info: Optional[Dict[str, Any]]) -> List[str]:
+    """Return the critical fields still missing, in the order they should be asked."""
+    business_info = business_info or {}
+    return [field for field in _CRITICAL_FIELDS if not business_info.get(field)]
+
+
 def get_business_info_status_from_state(state: PYMESState) -> str:
     """Get the current status of business information."""
     business_info = state.get("business_info", {})
-    required_fields = ["nombre_empresa", "sector", "productos_servicios_principales", "ubicacion"]
 
     if not business_info:
         return "Not started"
 
-    missing_fields = [field for field in required_fields if not business_info.get(field)]
-
-    if not missing_fields:
-        return "Complete"
-    elif len(missing_fields) < len(required_fields):
-        return "Partial"
-    else:
-        return "Missing"
+    return _STATUS_BY_MISSING[len(get_missing_critical_fields(business_info))]
 
 
 def get_research_status_from_state(state: PYMESState) -> str:
@@ -430,12 +604,8 @@ def supervisor_node(state: PYMESState) -> Dict[str, Any]:
         business_info_status = get_business_info_status_from_state(state)
         research_status = get_research_status_from_state(state)
 
-        messages = state.get("messages", [])
-        last_message = messages[-1] if messages else None
-        user_message = last_message.content if isinstance(last_message, HumanMessage) else ""
-
         # Supervisor decision logic (without LLM for simplicity)
-        logger.info(f"Info status: {business_info_status}, research: {research_status}")
+        logger.info("Info status: %s, research: %s", business_info_status, research_status)
 
         # Decision based on clear rules
         if business_info_status in ["Not started", "Missing", "Partial"]:
@@ -448,17 +618,20 @@ def supervisor_node(state: PYMESState) -> Dict[str, Any]:
             agent_target = "consultant"
             task_desc = "Provide conversational advice"
 
-        logger.info(f"Supervisor decided: {agent_target} - {task_desc}")
+        logger.info("Supervisor decided: %s - %s", agent_target, task_desc)
 
-        # Use Command for handoff
-        return {
-            "current_agent": agent_target,
-            "last_handoff": task_desc,
-            "messages": [AIMessage(content=f"Transferring to {agent_target}: {task_desc}")]
-        }
+        # Pure routing: only current_agent matters to route_after_supervisor. No
+        # "Transferring to" message (it polluted the history sent to the agents),
+        # and no write at all when the decision did not change
+        update: Dict[str, Any] = {}
+        if state.get("current_agent") != agent_target:
+            update["current_agent"] = agent_target
+        if state.get("last_handoff") != task_desc:
+            update["last_handoff"] = task_desc
+        return update
 
     except Exception as e:
-        logger.error(f"Error in supervisor_node: {str(e)}")
+        logger.error("Error in supervisor_node: %s", e)
         # Fallback: go to consultant if there's an error
         return {
             "current_agent": "consultant",
@@ -471,104 +644,98 @@ def save_business_info(info: str):
     """Save extracted business information in long-term memory."""
     try:
         # This tool simulates saving - in reality, it will be handled in the node
-        logger.info(f"Saving business information: {info}")
+        logger.info("Saving business information: %s", info)
         return "Business information saved successfully in long-term memory"
     except Exception as e:
-        logger.error(f"Error saving information: {str(e)}")
+        logger.error("Error saving information: %s", e)
         return "Error saving information"
 
 
+@_safe_agent_node("Hubo un error. ¿Podrías repetir tu información?")
 def info_extractor_agent_node(state: PYMESState) -> Dict[str, Any]:
     """Specialized agent for extracting business information using intelligent evaluator."""
-    try:
-        logger.info("🤖 info_extractor_agent_node activado")
-        
-        # Verificar estado inicial
-        initial_business_info = state.get("business_info", {})
-        logger.info(f"📊 Estado business_info INICIAL en agente: {initial_business_info}")
+    logger.info("🤖 info_extractor_agent_node activado")
+    
+    # Verificar estado inicial
+    initial_business_info = state.get("business_info", {})
+    logger.info("📊 Estado business_info INICIAL en agente: %s", initial_business_info)
 
-        # First, execute the intelligent evaluator to extract information
-        evaluator_result = business_info_evaluator_node(state)
-        
-        # Get the updated information from the evaluator
-        updated_business_info = evaluator_result.get("business_info", {})
-        logger.info(f"📊 Estado business_info DESPUÉS del evaluador: {updated_business_info}")
+    # First, execute the intelligent evaluator to extract information
+    evaluator_result = business_info_extraction_node_sync(state)
+    
+    # Get the updated information from the evaluator (no update: the state is already current)
+    updated_business_info = evaluator_result.get("business_info", initial_business_info)
+    logger.info("📊 Estado business_info DESPUÉS del evaluador: %s", updated_business_info)
+    
+    # Verificar si el agente recibió los cambios
+    if updated_business_info != initial_business_info:
+        logger.info("✅ AGENTE CONFIRMÓ QUE RECIBIÓ ESTADO ACTUALIZADO")
+    else:
+        logger.info("ℹ️ Agente no detectó cambios en el estado")
+    
+    # Determine what information is missing
+    missing_fields = get_missing_critical_fields(updated_business_info)
+    
+    logger.info("📋 Campos requeridos: %s", _CRITICAL_FIELDS)
+    logger.info("📋 Campos faltantes: %s (completitud %.0f%%)",
+                missing_fields, _COMPLETENESS_BY_MISSING[len(missing_fields)] * 100)
+    logger.info("📋 Información actual: %s", updated_business_info)
+
+    # Generate specific question or complete if we already have everything
+    if missing_fields:
+        # Generate question for the first missing field with context
+        field = missing_fields[0]
         
-        # Verificar si el agente recibió los cambios
-        if updated_business_info != initial_business_info:
-            logger.info("✅ AGENTE CONFIRMÓ QUE RECIBIÓ ESTADO ACTUALIZADO")
-        else:
-            logger.info("ℹ️ Agente no detectó cambios en el estado")
+        # Crear contexto basado en información ya recopilada
+        context_parts = []
+        if updated_business_info.get("nombre_empresa"):
+            context_parts.append(f"empresa {updated_business_info['nombre_empresa']}")
         
-        # Determine what information is missing
-        required_fields = ["nombre_empresa", "sector", "productos_servicios_principales", "ubicacion"]
-        missing_fields = [field for field in required_fields if not updated_business_info.get(field)]
+        context_str = f" de tu {context_parts[0]}" if context_parts else ""
         
-        logger.info(f"📋 Campos requeridos: {required_fields}")
-        logger.info(f"📋 Campos faltantes: {missing_fields}")
-        logger.info(f"📋 Información actual: {updated_business_info}")
-
-        # Generate specific question or complete if we already have everything
-        if missing_fields:
-            # Generate question for the first missing field with context
-            field = missing_fields[0]
-            
-            # Crear contexto basado en información ya recopilada
-            context_parts = []
-            if updated_business_info.get("nombre_empresa"):
-                context_parts.append(f"empresa {updated_business_info['nombre_empresa']}")
-            
-            context_str = f" de tu {context_parts[0]}" if context_parts else ""
-            
-            field_questions = {
-                "nombre_empresa": "¡Hola! 👋 Soy tu asistente de negocios. Para brindarte la mejor ayuda personalizada, ¿cuál es el nombre de tu empresa o negocio?",
-                "sector": f"Perfecto{context_str}. Ahora, ¿en qué sector o industria opera tu negocio?",
-                "productos_servicios_principales": f"Excelente{context_str}. ¿Cuáles son los principales productos o servicios que ofreces?",
-                "ubicacion": f"Muy bien{context_str}. ¿Dónde opera principalmente tu negocio?"
-            }
+        field_questions = {
+            "nombre_empresa": "¡Hola! 👋 Soy tu asistente de negocios. Para brindarte la mejor ayuda personalizada, ¿cuál es el nombre de tu empresa o negocio?",
+            "sector": f"Perfecto{context_str}. Ahora, ¿en qué sector o industria opera tu negocio?",
+            "productos_servicios_principales": f"Excelente{context_str}. ¿Cuáles son los principales productos o servicios que ofreces?",
+            "ubicacion": f"Muy bien{context_str}. ¿Dónde opera principalmente tu negocio?"
+        }
 
-            question = field_questions.get(field, "¿Podrías proporcionar más información sobre tu negocio?")
+        question = field_questions.get(field, "¿Podrías proporcionar más información sobre tu negocio?")
 
-            # IMPORTANTE: Devolver directamente la respuesta sin redirigir a human_feedback
-            # Esto evita el bucle infinito
-            return {
-                "messages": [AIMessage(content=question)],
-                "business_info": updated_business_info,
-                "answer": question,  # Agregar answer para compatibilidad
-                "stage": "info_gathering"
-            }
-        else:
-            # Complete information, transfer to researcher
-            logger.info("Business information complete, transferring to researcher")
-            
-            # Crear mensaje personalizado con la información recopilada
-            empresa = updated_business_info.get("nombre_empresa", "tu empresa")
-            sector = updated_business_info.get("sector", "")
-            productos = updated_business_info.get("productos_servicios_principales", "")
-            ubicacion = updated_business_info.get("ubicacion", "")
-            
-            completion_message = f"¡Excelente! 🎉 He recopilado toda la información de {empresa}:\n\n"
-            completion_message += f"🏢 Empresa: {empresa}\n"
-            completion_message += f"🏭 Sector: {sector}\n"
-            completion_message += f"📦 Productos/Servicios: {productos}\n"
-            completion_message += f"📍 Ubicación: {ubicacion}\n\n"
-            completion_message += "Ahora voy a investigar oportunidades específicas de crecimiento para tu negocio. ¡Un momento por favor! 🔍"
-
-            return {
-                "messages": [AIMessage(content=completion_message)],
-                "current_agent": "researcher",  # Handoff to researcher
-                "last_handoff": "Complete information, start market research",
-                "business_info": updated_business_info,
-                "answer": completion_message,  # Agregar answer para compatibilidad
-                "stage": "info_completed"
-            }
+        # IMPORTANTE: Devolver directamente la respuesta sin redirigir a human_feedback
+        # Esto evita el bucle infinito
+        return {
+            "messages": [AIMessage(content=question)],
+            "business_info": updated_business_info,
+            "answer": question,  # Agregar answer para compatibilidad
+            "stage": "info_gathering"
+        }
+    else:
+        # Complete information, transfer to researcher
+        logger.info("Business information complete, transferring to researcher")
+        
+        # Crear mensaje personalizado con la información recopilada
+        empresa = updated_business_info.get("nombre_empresa", "tu empresa")
+        sector = updated_business_info.get("sector", "")
+        productos = updated_business_info.get("productos_servicios_principales", "")
+        ubicacion = updated_business_info.get("ubicacion", "")
+        
+        completion_message = (
+            f"¡Excelente! 🎉 He recopilado toda la información de {empresa}:\n\n"
+            f"🏢 Empresa: {empresa}\n"
+            f"🏭 Sector: {sector}\n"
+            f"📦 Productos/Servicios: {productos}\n"
+            f"📍 Ubicación: {ubicacion}\n\n"
+            "Ahora voy a investigar oportunidades específicas de crecimiento para tu negocio. ¡Un momento por favor! 🔍"
+        )
 
-    except Exception as e:
-        logger.error(f"Error in info_extractor_agent_node: {str(e)}")
-        error_message = "Hubo un error. ¿Podrías repetir tu información?"
         return {
-            "messages": [AIMessage(content=error_message)],
-            "answer": error_message
+            "messages": [AIMessage(content=completion_message)],
+            "current_agent": "researcher",  # Handoff to researcher
+            "last_handoff": "Complete information, start market research",
+            "business_info": updated_business_info,
+            "answer": completion_message,  # Agregar answer para compatibilidad
+            "stage": "info_completed"
         }
 
 
@@ -576,107 +743,159 @@ def info_extractor_agent_node(state: PYMESState) -> Dict[str, Any]:
 def save_research_results(results: str):
     """Save research results in long-term memory."""
     try:
-        logger.info(f"Saving research results: {results[:100]}...")
+        logger.info("Saving research results: %s...", results[:100])
         return "Research results saved successfully"
     except Exception as e:
-        logger.error(f"Error saving research: {str(e)}")
+        logger.error("Error saving research: %s", e)
         return "Error saving research results"
 
 
-def researcher_agent_node(state: PYMESState):
-    """Specialized agent for market research."""
-    try:
-        logger.info("Researcher agent activated")
+# === AGENT FACTORIES ===
 
-        llm = ChatOpenAI(model=LLM_MODEL, temperature=0.1)
+@functools.lru_cache
+def get_agent_llm() -> ChatOpenAI:
+    """Shared chat model for the ReAct agents (one client and connection pool per process)."""
+    return ChatOpenAI(model=LLM_MODEL, temperature=0.1)
 
-        # Tools for the researcher
-        from app.graph.nodes import search  # Import existing search tool
-        researcher_tools = [search, transfer_to_consultant, transfer_to_info_extractor, save_research_results]
 
-        # Create ReAct agent with business information in the prompt
-        business_info = state.get("business_info", {})
-        enhanced_prompt = RESEARCHER_PROMPT
+@functools.lru_cache
+def get_researcher_agent():
+    """Build the researcher ReAct agent once; business information is injected per call by the prompt builder."""
+    llm = get_agent_llm()
+
+    # Tools for the researcher
+    from app.graph.nodes import search  # Import existing search tool
+    researcher_tools = [search, *AGENT_HANDOFF_TOOLS["researcher"], save_research_results]
+
+    return create_react_agent(
+        llm, researcher_tools, prompt=_with_business_context(RESEARCHER_PROMPT), state_schema=PYMESAgentState
+    )
+
+
+@functools.lru_cache
+def get_consultant_agent():
+    """Build the consultant ReAct agent once."""
+    llm = get_agent_llm()
+
+    # Tools for the consultant
+    from app.graph.nodes import search, search_documents
+    consultant_tools = [search, search_documents, *AGENT_HANDOFF_TOOLS["consultant"]]
+
+    return create_react_agent(
+        llm, consultant_tools, prompt=_with_business_context(CONSULTANT_PROMPT), state_schema=PYMESAgentState
+    )
 
-        if business_info:
-            business_context = f"\n\nAVAILABLE BUSINESS INFORMATION:\n{business_info}\n\nUse this information to generate specific and relevant research."
-            enhanced_prompt += business_context
 
-        # Create ReAct agent
-        agent = create_react_agent(llm, researcher_tools, prompt=enhanced_prompt)
+def warmup_agents() -> None:
+    """Build every agent in parallel so the first request does not pay for it."""
+    factories = (get_researcher_agent, get_consultant_agent)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(factories)) as executor:
+        list(executor.map(lambda factory: factory(), factories))
+    logger.info("✅ Agentes inicializados")
 
-        # Execute agent
-        result = agent.invoke(state)
 
-        # Save research results if generated
-        messages = result["messages"]
-        research_content = extract_research_from_messages(messages)
+@_safe_agent_node("There was an error in research. Let's try again.")
+def researcher_agent_node(state: PYMESState):
+    """Specialized agent for market research."""
+    logger.info("Researcher agent activated")
+
+    agent = get_researcher_agent()
+
+    # Execute agent
+    result = agent.invoke(_agent_input(state))
 
-        if research_content:
+    # Save research results if generated (only from this turn's messages)
+    messages = _new_agent_messages(state, result)
+    research_content = extract_research_from_messages(messages)
+
+    if research_content:
+        try:
+            memory_service = get_memory_service()
+            thread_id = get_thread_id_from_state(state)
+            # Usar asyncio.create_task para ejecutar la función async sin await
+            import asyncio
             try:
-                memory_service = get_memory_service()
-                thread_id = get_thread_id_from_state(state)
-                # Usar asyncio.create_task para ejecutar la función async sin await
-                import asyncio
-                try:
-                    # Intentar ejecutar en el loop actual
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        # Si hay un loop corriendo, crear una tarea
-                        asyncio.create_task(memory_service.save_research_results(
-                            thread_id, {"content": research_content, "timestamp": time.time()}
-                        ))
-                    else:
-                        # Si no hay loop, ejecutar directamente
-                        asyncio.run(memory_service.save_research_results(
-                            thread_id, {"content": research_content, "timestamp": time.time()}
-                        ))
-                except RuntimeError:
-                    # Si no se puede obtener el loop, crear uno nuevo
+                # Intentar ejecutar en el loop actual
+                loop = asyncio.get_event_loop()
+                if loop.is_running():
+                    # Si hay un loop corriendo, crear una tarea
+                    asyncio.create_task(memory_service.save_research_results(
+                        thread_id, {"content": research_content, "timestamp": time.time()}
+                    ))
+                else:
+                    # Si no hay loop, ejecutar directamente
                     asyncio.run(memory_service.save_research_results(
                         thread_id, {"content": research_content, "timestamp": time.time()}
                     ))
-                logger.info(f"Resultados de investigación guardados para {thread_id}")
-            except Exception as e:
-                logger.warning(f"Error guardando resultados de investigación: {str(e)}")
-                # Continuar sin guardar en memoria
-
-            return {
-                "messages": result["messages"],
-                "context": research_content,
-                "web_search": "Research completed",
-                "stage": "research_completed"
-            }
+            except RuntimeError:
+                # Si no se puede obtener el loop, crear uno nuevo
+                asyncio.run(memory_service.save_research_results(
+                    thread_id, {"content": research_content, "timestamp": time.time()}
+                ))
+            logger.info("Resultados de investigación guardados para %s", thread_id)
+        except Exception as e:
+            logger.warning("Error guardando resultados de investigación: %s", e)
+            # Continuar sin guardar en memoria
+
+        return {
+            "messages": messages,
+            "context": research_content,
+            "web_search": "Research completed",
+            "stage": "research_completed"
+        }
 
-        return {"messages": result["messages"]}
+    return {"messages": messages}
 
-    except Exception as e:
-        logger.error(f"Error in researcher_agent_node: {str(e)}")
-        return {"messages": [AIMessage(content="There was an error in research. Let's try again.")]}
 
+def _recent_history(state: PYMESState) -> List:
+    """Últimos HISTORY_WINDOW mensajes anteriores a la pregunta actual del usuario."""
+    messages = state.get("messages") or []
+    last_human_idx = get_last_human_index(state)
+    previous = messages[:last_human_idx] if last_human_idx is not None else messages
+    return previous[-HISTORY_WINDOW:]
 
+
+@_safe_agent_node("There was an error. How can I help you?")
 def consultant_agent_node(state: PYMESState):
     """Conversational consultant agent (original chatbot)."""
-    try:
-        logger.info("Conversational consultant agent activated")
+    logger.info("Conversational consultant agent activated")
 
-        llm = ChatOpenAI(model=LLM_MODEL, temperature=0.1)
+    user_message = get_last_user_input(state)
 
-        # Tools for the consultant
-        from app.graph.nodes import search, search_documents
-        consultant_tools = [search, search_documents, transfer_to_info_extractor, transfer_to_researcher]
+    # Trivial acknowledgement: canned reply, no LLM call
+    if user_message and is_acknowledgement(user_message):
+        return {"messages": [AIMessage(content=_ACK_REPLY)], "answer": _ACK_REPLY}
 
-        # Create ReAct agent
-        agent = create_react_agent(llm, consultant_tools, prompt=CONSULTANT_PROMPT)
+    # Semantic cache: reuse the answer to an equivalent question for the same business
+    # and the same recent history (exact partition); only the question is embedded
+    cache_vector = None
+    if SEMANTIC_CACHE_ENABLED and user_message:
+        try:
+            response_cache = get_response_cache()
+            cache_partition = response_cache.partition_key(state.get("business_info", {}), _recent_history(state))
+            cache_vector = response_cache.embed(user_message)
+            cached_answer = response_cache.lookup(cache_partition, cache_vector)
+            if cached_answer:
+                return {"messages": [AIMessage(content=cached_answer)], "answer": cached_answer}
+        except Exception as e:
+            logger.warning("Semantic cache unavailable: %s", e)
 
-        # Execute agent
-        result = agent.invoke(state)
+    agent = get_consultant_agent()
 
-        return {"messages": result["messages"]}
+    # Execute agent
+    result = agent.invoke(_agent_input(state))
 
-    except Exception as e:
-        logger.error(f"Error in consultant_agent_node: {str(e)}")
-        return {"messages": [AIMessage(content="There was an error. How can I help you?")]}
+    messages = _new_agent_messages(state, result)
+
+    final_message = messages[-1] if messages else None
+    if cache_vector is not None and isinstance(final_message, AIMessage) and final_message.content and not final_message.tool_calls:
+        get_response_cache().add(cache_partition, cache_vector, final_message.content)
+
+    return {"messages": messages}
+
+
+# Mensajes recientes entre los que se busca la respuesta del turno
+_ANSWER_LOOKBACK = 4
 
 
 def human_feedback_node(state: PYMESState) -> Command:
@@ -686,17 +905,22 @@ def human_feedback_node(state: PYMESState) -> Command:
     """
     logger.info("🔄 human_feedback_node: Esperando entrada del usuario...")
 
+    # La respuesta del turno se referencia por id: su texto ya está en el canal de
+    # mensajes y no se duplica en el payload del interrupt guardado en el checkpoint
+    messages = state.get("messages") or []
+    answer_message = next(
+        (msg for msg in messages[:-_ANSWER_LOOKBACK - 1:-1] if isinstance(msg, AIMessage) and msg.content),
+        None
+    )
+
     # Usar interrupt() siguiendo el patrón del código de referencia
     # NO usar try-catch aquí porque interrupt() es el comportamiento esperado
     user_input_from_interrupt = interrupt({
-        "answer": state.get("answer", "Esperando respuesta del asistente."),
+        "answer_id": answer_message.id if answer_message else None,
         "message": "Proporcione su respuesta:"
     })
 
-    logger.info(f"🔄 human_feedback_node: Entrada recibida: {user_input_from_interrupt}")
-
-    # Actualizar historial de feedback
-    updated_feedback_list = state.get("feedback", []) + [user_input_from_interrupt]
+    logger.info("🔄 human_feedback_node: Entrada recibida: %s", user_input_from_interrupt)
 
     # Crear mensaje de usuario para el historial
     user_message_for_history = HumanMessage(content=user_input_from_interrupt)
@@ -704,17 +928,16 @@ def human_feedback_node(state: PYMESState) -> Command:
     # Payload de actualización
     update_payload = {
         "messages": [user_message_for_history],
-        "feedback": updated_feedback_list,
-        "input": user_input_from_interrupt
+        "feedback": [user_input_from_interrupt],  # El reducer del canal lo añade al historial
+        "last_human_idx": len(state.get("messages", []))  # Posición que ocupará el nuevo mensaje
     }
 
     # Verificar si el usuario quiere terminar
-    termination_words = ["done", "thanks", "bye", "adios", "terminate", "exit", "gracias", "chau", "fin"]
-    if user_input_from_interrupt.strip().lower() in termination_words:
-        logger.info(f"🔄 human_feedback_node: Usuario terminó conversación: {user_input_from_interrupt}")
+    if is_termination_reply(user_input_from_interrupt):
+        logger.info("🔄 human_feedback_node: Usuario terminó conversación: %s", user_input_from_interrupt)
         return Command(update=update_payload, goto=END)
     else:
-        logger.info(f"🔄 human_feedback_node: Usuario continúa conversación: {user_input_from_interrupt}")
+        logger.info("🔄 human_feedback_node: Usuario continúa conversación: %s", user_input_from_interrupt)
         # Volver al business_evaluator para procesar la nueva entrada
         return Command(update=update_payload, goto="business_evaluator")
 
@@ -761,69 +984,127 @@ def route_after_agents(state: PYMESState) -> Literal["human_feedback"]:
     return "human_feedback"
 
 
+_supervisor_graph = None
+_supervisor_graph_lock = threading.Lock()
+_async_supervisor_graph = None
+_async_supervisor_graph_lock = asyncio.Lock()
+
+
 def create_supervisor_pymes_graph():
     """
-    Create the main graph with supervisor architecture.
+    Get the main graph with supervisor architecture.
+    The graph is compiled once and shared by every request.
     """
-    try:
-        logger.info("Creating supervisor PYMES graph...")
+    global _supervisor_graph
 
-        # Create the graph
-        workflow = StateGraph(PYMESState)
-
-        # === ADD NODES ===
-        workflow.add_node("supervisor", supervisor_node)
-        workflow.add_node("business_evaluator", business_info_evaluator_node)  # Intelligent evaluator node
-        workflow.add_node("info_extractor", info_extractor_agent_node)
-        workflow.add_node("researcher", researcher_agent_node)
-        workflow.add_node("consultant", consultant_agent_node)
-        workflow.add_node("human_feedback", human_feedback_node)
-
-        # === DEFINE FLOW ===
-
-        # Start -> Business evaluator -> Supervisor
-        workflow.add_edge(START, "business_evaluator")
-        workflow.add_edge("business_evaluator", "supervisor")
-
-        # Supervisor -> Specialized agents or feedback
-        workflow.add_conditional_edges(
-            "supervisor",
-            route_after_supervisor,
-            {
-                "info_extractor": "info_extractor",
-                "researcher": "researcher",
-                "consultant": "consultant",
-                "human_feedback": "human_feedback"
-            }
-        )
+    if _supervisor_graph is None:
+        with _supervisor_graph_lock:
+            if _supervisor_graph is None:
+                _supervisor_graph = _build_supervisor_pymes_graph()
 
-        # Agents -> human_feedback (evita bucles infinitos)
-        workflow.add_conditional_edges(
-            "info_extractor",
-            route_after_agents,
-            {
-                "human_feedback": "human_feedback"
-            }
-        )
+    return _supervisor_graph
 
-        workflow.add_conditional_edges(
-            "researcher",
-            route_after_agents,
-            {
-                "human_feedback": "human_feedback"
-            }
-        )
 
-        workflow.add_conditional_edges(
-            "consultant",
-            route_after_agents,
-            {
-                "human_feedback": "human_feedback"
-            }
-        )
+async def acreate_supervisor_pymes_graph():
+    """
+    Get the main graph compiled with the async Postgres checkpointer.
+    Use it with ainvoke/astream so checkpoint I/O does not block the event loop.
+    """
+    global _async_supervisor_graph
+
+    if _async_supervisor_graph is None:
+        async with _async_supervisor_graph_lock:
+            if _async_supervisor_graph is None:
+                from app.database.postgres import get_async_postgres_saver, get_postgres_store
+
+                try:
+                    _async_supervisor_graph = _build_supervisor_workflow().compile(
+                        checkpointer=await get_async_postgres_saver(),
+                        store=get_postgres_store()
+                    )
+                    logger.info("Async supervisor PYMES graph compiled successfully")
+                except Exception as e:
+                    logger.error("Error creating async supervisor graph: %s", e)
+                    raise
+
+    return _async_supervisor_graph
+
+
+def _build_supervisor_workflow() -> StateGraph:
+    """
+    Build the (uncompiled) supervisor workflow shared by the sync and async graphs.
+    """
+    # Create the graph
+    workflow = StateGraph(PYMESState)
+
+    # === ADD NODES ===
+    # Intelligent evaluator node (extraction + supervisor routing): sync and async
+    # entry points share the same coroutine
+    workflow.add_node(
+        "business_evaluator",
+        RunnableLambda(business_info_evaluator_node_sync, afunc=business_info_evaluator_node)
+    )
+    workflow.add_node("info_extractor", info_extractor_agent_node)
+    workflow.add_node("researcher", researcher_agent_node)
+    workflow.add_node("consultant", consultant_agent_node)
+    workflow.add_node("human_feedback", human_feedback_node)
+
+    # === DEFINE FLOW ===
+
+    # Start -> Business evaluator (extracts and routes)
+    workflow.add_edge(START, "business_evaluator")
+
+    # Business evaluator -> Specialized agents or feedback
+    workflow.add_conditional_edges(
+        "business_evaluator",
+        route_after_supervisor,
+        {
+            "info_extractor": "info_extractor",
+            "researcher": "researcher",
+            "consultant": "consultant",
+            "human_feedback": "human_feedback"
+        }
+    )
+
+    # Agents -> human_feedback (evita bucles infinitos)
+    workflow.add_conditional_edges(
+        "info_extractor",
+        route_after_agents,
+        {
+            "human_feedback": "human_feedback"
+        }
+    )
+
+    workflow.add_conditional_edges(
+        "researcher",
+        route_after_agents,
+        {
+            "human_feedback": "human_feedback"
+        }
+    )
+
+    workflow.add_conditional_edges(
+        "consultant",
+        route_after_agents,
+        {
+            "human_feedback": "human_feedback"
+        }
+    )
+
+    # Human feedback uses Command to decide where to go
+    # No need for static edge because uses Command(goto=...)
+
+    return workflow
+
+
+def _build_supervisor_pymes_graph():
+    """
+    Build and compile the main graph with supervisor architecture.
+    """
+    try:
+        logger.info("Creating supervisor PYMES graph...")
 
-        # Human feedback uses Command to decide where to go
-        # No need for static edge because uses Command(goto=...)
+        workflow = _build_supervisor_workflow()
 
         # === COMPILE ===
         from app.database.postgres import get_postgres_saver, get_postgres_store
@@ -840,7 +1121,7 @@ def create_supervisor_pymes_graph():
         return compiled_graph
 
     except Exception as e:
-        logger.error(f"Error creating supervisor graph: {str(e)}")
+        logger.error("Error creating supervisor graph: %s", e)
         raise
 
 
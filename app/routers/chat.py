@@ -1,10 +1,11 @@
 import logging
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
 from pydantic import BaseModel, Field
 
-from app.services.chat_service import process_message, get_chat_history
+from app.services.chat_service import aprocess_message, astream_message, get_chat_history
 
 router = APIRouter(
     prefix="/chat",
@@ -51,7 +52,7 @@ async def chat_message(request: ChatRequest) -> Dict[str, Any]:
     """
     try:
         logger.info(f"Processing chat message for thread: {request.thread_id}")
-        result = process_message(
+        result = await aprocess_message(
             message=request.message,
             thread_id=request.thread_id,
             reset_thread=request.reset_thread
@@ -65,6 +66,28 @@ async def chat_message(request: ChatRequest) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """
+    Send a message to the chat assistant and stream the response as it is generated.
+
+    Args:
+        request: The chat request containing the message and thread ID
+
+    Returns:
+        A plain-text streaming response with the assistant's answer
+    """
+    logger.info(f"Streaming chat message for thread: {request.thread_id}")
+    return StreamingResponse(
+        astream_message(
+            message=request.message,
+            thread_id=request.thread_id,
+            reset_thread=request.reset_thread
+        ),
+        media_type="text/plain; charset=utf-8"
+    )
+
+
 @router.get("/history/{thread_id}", response_model=ChatHistoryResponse)
 async def chat_history(thread_id: str) -> Dict[str, Any]:
     """
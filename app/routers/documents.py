@@ -3,7 +3,7 @@ from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
 from pydantic import BaseModel, Field
 
-from app.services.document_service import DocumentService
+from app.services.document_service import DocumentService, get_document_service as get_shared_document_service
 
 router = APIRouter(
     prefix="/documents",
@@ -16,8 +16,7 @@ logger = logging.getLogger(__name__)
 # Dependency for document service
 def get_document_service():
     try:
-        service = DocumentService()
-        return service
+        return get_shared_document_service()
     except Exception as e:
         logger.error(f"Error initializing document service: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Could not initialize document service: {str(e)}")
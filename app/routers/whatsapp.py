@@ -1,12 +1,13 @@
 import logging
 import os
+import re
 import traceback
 from typing import Dict, Any
 import httpx
 from fastapi import APIRouter, Request, Response
 
 # Importar tu servicio existente
-from app.services.chat_service import process_message
+from app.services.chat_service import aprocess_message
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,10 @@ whatsapp_router = APIRouter(
     tags=["whatsapp"],
 )
 
+# Preguntas que llevan botones de respuesta rápida (una sola pasada, sin copiar el texto en minúsculas)
+_SECTOR_QUESTION_RE = re.compile(r"sector|industria|opera tu negocio|tipo de negocio|rubro", re.IGNORECASE)
+_LOCATION_QUESTION_RE = re.compile(r"d[óo]nde opera|ubicación|opera principalmente", re.IGNORECASE)
+
 # Credenciales de WhatsApp API
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
@@ -134,7 +139,7 @@ async def handle_incoming_message(message_data: Dict[str, Any]) -> None:
             del active_interrupts[thread_id]
 
         # Usar tu servicio existente
-        result = process_message(
+        result = await aprocess_message(
             message=user_message,
             thread_id=thread_id,
             is_resuming=is_resuming
@@ -168,16 +173,12 @@ def create_location_buttons():
 
 def get_buttons_for_question(question: str):
     """Determina qué botones mostrar según la pregunta."""
-    question_lower = question.lower()
-    
     # Detectar preguntas sobre sector/industria
-    sector_keywords = ["sector", "industria", "opera tu negocio", "tipo de negocio", "rubro"]
-    if any(keyword in question_lower for keyword in sector_keywords):
+    if _SECTOR_QUESTION_RE.search(question):
         return create_sector_buttons()
     
     # Detectar preguntas sobre ubicación
-    location_keywords = ["dónde opera", "ubicación", "donde opera", "opera principalmente"]
-    if any(keyword in question_lower for keyword in location_keywords):
+    if _LOCATION_QUESTION_RE.search(question):
         return create_location_buttons()
     
     return None
@@ -1,15 +1,25 @@
+import asyncio
+import hashlib
 import logging
 import uuid
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set
 from functools import lru_cache
 
 from langchain_core.messages import BaseMessage
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
-from app.config.settings import LLM_MODEL
+from app.config.settings import (
+    LLM_MODEL_ROUTER,
+    EXTRACTION_CACHE_TTL,
+    EXTRACTION_CACHE_MAX_ENTRIES
+)
+from app.graph.state import is_no_data_reply
 from app.services.memory_service import get_memory_service
+from app.utils.cache import TTLCache
+from app.utils.serialization import stable_json
 
 logger = logging.getLogger(__name__)
 
@@ -30,20 +40,28 @@ class BusinessInfoAnalysis(BaseModel):
     )
 
 
-class BusinessInfoManager:
-    """Manager class para manejar extracción de información empresarial."""
+# Campos conocidos de business_info que se envían a los prompts, y longitud máxima por valor
+BUSINESS_INFO_PROMPT_KEYS = (
+    "nombre_empresa", "sector", "productos_servicios_principales", "ubicacion",
+    "desafios_principales", "descripcion_negocio", "anos_operacion", "num_empleados",
+)
+MAX_PROMPT_VALUE_CHARS = 200
 
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        self.llm = ChatOpenAI(
-            model=LLM_MODEL,
-            temperature=0.1,
-            max_retries=2,
-        ).with_structured_output(BusinessInfoAnalysis, method="function_calling")
 
-    async def _analyze_business_info(self, message: str, current_info: Dict[str, Any]) -> BusinessInfoAnalysis:
-        """Analiza un mensaje para determinar importancia y extraer información empresarial."""
-        prompt = f"""Extrae y formatea información empresarial importante del mensaje del usuario.
+def compact_business_info(business_info: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Reduce business_info a los campos conocidos y no vacíos, con valores acotados para el prompt."""
+    if not business_info:
+        return {}
+    return {
+        key: str(business_info[key])[:MAX_PROMPT_VALUE_CHARS]
+        for key in BUSINESS_INFO_PROMPT_KEYS
+        if business_info.get(key)
+    }
+
+
+# Prompt de análisis compilado una sola vez al importar el módulo
+# Instrucciones y ejemplos fijos primero (prefijo cacheable por el proveedor); los datos del turno van al final
+BUSINESS_INFO_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([("system", """Extrae y formatea información empresarial importante del mensaje del usuario.
         Enfócate en información factual, no en solicitudes o comentarios sobre recordar cosas.
 
         Información empresarial importante incluye:
@@ -64,8 +82,6 @@ class BusinessInfoManager:
         5. Devuelve valores como strings simples
         6. IMPORTANTE: Detecta información de ubicación/operación incluso en respuestas cortas
 
-        Información actual: {current_info}
-
         Ejemplos:
         Input: "Mi empresa se llama TechSolutions y nos dedicamos al desarrollo de software"
         Output: {{
@@ -128,10 +144,49 @@ class BusinessInfoManager:
             "is_important": false,
             "extracted_info": null
         }}
+        """), ("human", "Información actual: {current_info}\n\nMensaje: {message}")])
 
-        Mensaje: {message}
-        """
-        return await self.llm.ainvoke(prompt)
+
+class BusinessInfoManager:
+    """Manager class para manejar extracción de información empresarial."""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        # Tarea de clasificación + extracción: modelo pequeño y temperatura 0. Sin max_tokens:
+        # el esquema ya acota la salida y un límite podría cortar los argumentos de la función
+        self.llm = ChatOpenAI(
+            model=LLM_MODEL_ROUTER,
+            temperature=0.0,
+            max_retries=2,
+        ).with_structured_output(BusinessInfoAnalysis, method="function_calling")
+        self.analysis_chain = BUSINESS_INFO_ANALYSIS_PROMPT | self.llm
+        # Memo de análisis: el mismo mensaje sobre la misma información no se vuelve a enviar al LLM
+        self._analysis_cache = TTLCache(maxsize=EXTRACTION_CACHE_MAX_ENTRIES, ttl=EXTRACTION_CACHE_TTL)
+        # Referencias a los guardados en segundo plano para que no los recolecte el GC
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _analysis_cache_key(message: str, current_info: Dict[str, Any]) -> tuple:
+        """Clave estable (entre procesos) para el memo: digest del mensaje + huella de la información actual."""
+        digest = hashlib.blake2b(message.encode("utf-8"), digest_size=8).hexdigest()
+        return digest, stable_json(current_info)
+
+    async def _analyze_business_info_cached(self, message: str, current_info: Dict[str, Any]) -> BusinessInfoAnalysis:
+        """Versión memoizada de _analyze_business_info."""
+        key = self._analysis_cache_key(message, current_info)
+        analysis = self._analysis_cache.get(key)
+        if analysis is None:
+            analysis = await self._analyze_business_info(message, current_info)
+            self._analysis_cache.set(key, analysis)
+        else:
+            self.logger.info("♻️ Análisis de información empresarial recuperado del memo")
+        return analysis
+
+    async def _analyze_business_info(self, message: str, current_info: Dict[str, Any]) -> BusinessInfoAnalysis:
+        """Analiza un mensaje para determinar importancia y extraer información empresarial."""
+        return await self.analysis_chain.ainvoke(
+            {"message": message, "current_info": stable_json(compact_business_info(current_info))}
+        )
 
     async def extract_and_store_business_info(self, message: BaseMessage, current_info: Dict[str, Any], thread_id: str = None) -> Dict[str, Any]:
         """Extrae información empresarial importante de un mensaje y la almacena."""
@@ -139,46 +194,66 @@ class BusinessInfoManager:
             self.logger.info("ℹ️ Mensaje no es de usuario, devolviendo información actual")
             return current_info
 
-        self.logger.info(f"🔍 Analizando mensaje: '{message.content[:100]}...' para thread_id: {thread_id}")
-        self.logger.info(f"📊 Estado actual business_info: {current_info}")
+        # Mensajes vacíos o respuestas de una palabra sin datos: no se llama al LLM
+        text = message.content.strip() if isinstance(message.content, str) else ""
+        if not text or is_no_data_reply(text):
+            self.logger.info("ℹ️ Mensaje sin información empresarial posible, se omite el análisis")
+            return current_info
+
+        self.logger.info("🔍 Analizando mensaje: '%s...' para thread_id: %s", message.content[:100], thread_id)
+        self.logger.info("📊 Estado actual business_info: %s", current_info)
 
         # Analizar el mensaje para importancia y formateo
-        analysis = await self._analyze_business_info(message.content, current_info)
+        analysis = await self._analyze_business_info_cached(message.content, current_info)
         
         if analysis.is_important and analysis.extracted_info:
-            # Fusionar información nueva con la existente
-            updated_info = current_info.copy()
-            
+            # Solo valores no vacíos que difieran de los actuales (para simplificar, todo como strings)
+            changes = {}
             for field, value in analysis.extracted_info.items():
-                if value is not None and value.strip():  # Solo valores no vacíos
-                    # Para simplificar, tratamos todo como strings
-                    updated_info[field] = value.strip()
-            
-            # Verificar si hay cambios significativos
-            if updated_info != current_info:
-                self.logger.info(f"✅ Nueva información empresarial extraída: {analysis.extracted_info}")
-                self.logger.info(f"📈 Estado business_info ANTES: {current_info}")
-                self.logger.info(f"📈 Estado business_info DESPUÉS: {updated_info}")
+                value = value.strip() if value is not None else ""
+                if value and current_info.get(field) != value:
+                    changes[field] = value
+
+            # Verificar si hay cambios significativos: sin cambios no se copia el estado
+            if changes:
+                # Fusionar información nueva con la existente con un único update
+                updated_info = current_info.copy()
+                updated_info.update(changes)
+
+                self.logger.info("✅ Nueva información empresarial extraída: %s", analysis.extracted_info)
+                self.logger.info("📈 Estado business_info ANTES: %s", current_info)
+                self.logger.info("📈 Estado business_info DESPUÉS: %s", updated_info)
                 
-                # Guardar en memoria a largo plazo si hay cambios y tenemos thread_id
+                # Guardar en memoria a largo plazo si hay cambios y tenemos thread_id.
+                # Se lanza en segundo plano: el embedding + upsert no bloquea la respuesta del grafo
                 if thread_id:
-                    try:
-                        memory_service = get_memory_service()
-                        await memory_service.save_business_info(thread_id, updated_info)
-                        self.logger.info(f"💾 Información guardada en memoria a largo plazo para thread: {thread_id}")
-                    except Exception as e:
-                        self.logger.error(f"Error guardando en memoria: {str(e)}")
+                    self._schedule_memory_save(thread_id, updated_info)
                 else:
                     self.logger.warning("⚠️ No se proporcionó thread_id, no se guardará en memoria a largo plazo")
-            else:
-                self.logger.info("ℹ️ No se detectaron cambios en la información empresarial")
-            
-            return updated_info
+
+                return updated_info
+
+            self.logger.info("ℹ️ No se detectaron cambios en la información empresarial")
         else:
             self.logger.info("ℹ️ No se encontró información empresarial importante en el mensaje")
         
         return current_info
 
+    def _schedule_memory_save(self, thread_id: str, business_info: Dict[str, Any]) -> None:
+        """Lanza el guardado en memoria a largo plazo como tarea del loop actual."""
+        task = asyncio.get_running_loop().create_task(self._save_to_memory(thread_id, business_info))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _save_to_memory(self, thread_id: str, business_info: Dict[str, Any]) -> None:
+        """Guarda la información empresarial en memoria a largo plazo."""
+        try:
+            memory_service = get_memory_service()
+            await memory_service.save_business_info(thread_id, business_info)
+            self.logger.info("💾 Información guardada en memoria a largo plazo para thread: %s", thread_id)
+        except Exception as e:
+            self.logger.error("Error guardando en memoria: %s", e)
+
     def get_relevant_business_info(self, context: str, current_info: Dict[str, Any]) -> str:
         """Recupera información empresarial relevante basada en el contexto actual."""
         if not current_info:
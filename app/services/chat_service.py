@@ -1,14 +1,218 @@
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional
 import traceback
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, messages_from_dict
 from langgraph.types import Command
 
 from app.database.postgres import get_postgres_saver, get_async_postgres_saver
-from app.graph.supervisor_architecture import create_supervisor_pymes_graph
+from app.graph.supervisor_architecture import (
+    create_supervisor_pymes_graph, acreate_supervisor_pymes_graph, HISTORY_NAMESPACE
+)
 
 logger = logging.getLogger(__name__)
 
+# Nodos cuyos tokens se reenvían al cliente durante el streaming
+STREAMING_NODES = frozenset({"agent", "info_extractor", "researcher", "consultant"})
+
+# La respuesta del turno casi siempre está entre los últimos mensajes; no se recorre todo el historial
+ANSWER_SCAN_WINDOW = 4
+
+# Máximo de bloques de historial archivado que se leen del store
+ARCHIVE_SEARCH_LIMIT = 1000
+
+
+def _build_config(thread_id: str, reset_thread: bool = False) -> Dict[str, Any]:
+    """Set up configuration with the thread_id and recursion limit."""
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "reset_thread": reset_thread
+        },
+        "recursion_limit": 100  # Aumentar límite de recursión para evitar errores
+    }
+
+
+def _get_history_length(graph, config: Dict[str, Any]) -> Optional[int]:
+    """Number of messages already stored for the thread, or None if the state can't be read."""
+    try:
+        state = graph.get_state(config)
+        logger.info(f"Retrieved existing state for thread {config['configurable']['thread_id']}")
+        return len(state.values.get("messages", []))
+    except Exception as e:
+        logger.info(f"No existing state found for thread {config['configurable']['thread_id']}: {str(e)}")
+        return None
+
+
+async def _aget_history_length(graph, config: Dict[str, Any]) -> Optional[int]:
+    """Async version of _get_history_length for graphs compiled with the async checkpointer."""
+    try:
+        state = await graph.aget_state(config)
+        logger.info(f"Retrieved existing state for thread {config['configurable']['thread_id']}")
+        return len(state.values.get("messages", []))
+    except Exception as e:
+        logger.info(f"No existing state found for thread {config['configurable']['thread_id']}: {str(e)}")
+        return None
+
+
+def _build_graph_input(
+        message: str,
+        is_resuming: bool,
+        history_length: Optional[int] = None,
+        reset_thread: bool = False
+) -> Any:
+    """
+    Build the graph input: a resume Command after an interrupt, or the turn input.
+    history_length is the number of messages already in the thread, i.e. the index
+    the new HumanMessage takes once add_messages appends it (None: unknown).
+    """
+    if is_resuming:
+        # Use Command to resume with the user's message
+        return Command(resume=message)
+
+    # Only the keys this turn changes: the checkpointed business_info, stage,
+    # research context, etc. are kept instead of being overwritten every message
+    turn_input = {
+        "input": message,
+        "messages": [HumanMessage(content=message)],
+        "last_human_idx": history_length,
+    }
+    if not reset_thread:
+        return turn_input
+
+    # Reset: start the conversation state from scratch
+    return {
+        **turn_input,
+        "business_info": {},
+        "growth_goals": {},
+        "business_challenges": {},
+        "stage": "info_gathering",
+        "growth_proposal": None,
+        "context": "",
+        "summary": "",
+        "web_search": None,
+        "documents": None,
+        "answer": ""
+    }
+
+
+def _build_turn_response(
+        thread_id: str,
+        message: str,
+        state,
+        final_state_values: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Build the API response for a finished or interrupted turn.
+    state is the StateSnapshot after execution and final_state_values the
+    channel values of the latest checkpoint.
+    """
+    # Check if we're in an interrupt state
+    is_interrupted = False
+    interrupt_data = None
+    
+    # Check for interrupts in the state
+    if hasattr(state, 'tasks') and state.tasks:
+        for task in state.tasks:
+            if hasattr(task, 'interrupts') and task.interrupts:
+                is_interrupted = True
+                interrupt_data = task.interrupts[0] if task.interrupts else None
+                logger.info(f"Graph interrupted with data: {interrupt_data}")
+                break
+    
+    # Fallback: check if next node is human_feedback
+    if not is_interrupted and state.next and any("human_feedback" in node for node in state.next):
+        is_interrupted = True
+        logger.info(f"Graph interrupted at human_feedback for thread {thread_id}")
+
+    logger.info(f"[Thread: {thread_id}] Latest state retrieved. Next nodes: {state.next}")
+
+    # --- Extraer la respuesta final (usando final_state_values) ---
+    final_answer = "El asistente no generó una respuesta en este turno."
+    
+    # Si hay una interrupción, usar los datos de la interrupción
+    if is_interrupted and interrupt_data:
+        try:
+            # interrupt_data es un objeto Interrupt de LangGraph
+            if hasattr(interrupt_data, 'value') and isinstance(interrupt_data.value, dict):
+                interrupt_value = interrupt_data.value
+                answer_id = interrupt_value.get('answer_id')
+                if answer_id:
+                    # El nodo referencia la respuesta por id: se resuelve contra los mensajes del checkpoint
+                    messages = final_state_values.get("messages", [])
+                    final_answer = next(
+                        (msg.content for msg in reversed(messages) if getattr(msg, 'id', None) == answer_id),
+                        final_answer
+                    )
+                    logger.info(f"[Thread: {thread_id}] Using interrupt answer {answer_id}: {final_answer[:100]}...")
+                elif 'answer' in interrupt_value:
+                    final_answer = interrupt_value['answer']
+                    logger.info(f"[Thread: {thread_id}] Using interrupt answer: {final_answer[:100]}...")
+                else:
+                    logger.info(f"[Thread: {thread_id}] Interrupt value keys: {list(interrupt_value.keys())}")
+            elif isinstance(interrupt_data, dict) and 'answer' in interrupt_data:
+                final_answer = interrupt_data['answer']
+                logger.info(f"[Thread: {thread_id}] Using interrupt answer: {final_answer[:100]}...")
+            else:
+                logger.info(f"[Thread: {thread_id}] Interrupt data format: {type(interrupt_data)}")
+        except Exception as e:
+            logger.error(f"[Thread: {thread_id}] Error extracting interrupt data: {str(e)}")
+    
+    # Si no hay datos de interrupción, buscar en los mensajes
+    if final_answer == "El asistente no generó una respuesta en este turno.":
+        # Usar .get() en el diccionario final_state_values
+        all_messages: List[BaseMessage] = final_state_values.get("messages", [])
+        # ***********************
+        if all_messages:
+            # Search for the last AI message that's not an error message, only among the latest ones
+            for msg in all_messages[:-ANSWER_SCAN_WINDOW - 1:-1]:
+                if isinstance(msg, AIMessage):
+                    # Skip error messages from human_feedback_node
+                    if "Error procesando entrada" not in msg.content:
+                        final_answer = msg.content
+                        logger.info(f"[Thread: {thread_id}] Found last AI message content.")
+                        break
+                # Handle other potential message formats
+                elif hasattr(msg, 'role') and msg.get('role') == 'ai':
+                    content = msg.get('content', 'No content found')
+                    if "Error procesando entrada" not in content:
+                        final_answer = content
+                        logger.info(f"[Thread: {thread_id}] Found last AI message from role.")
+                        break
+        else:
+            logger.warning(f"[Thread: {thread_id}] No messages found in final state values.")
+
+    # Return appropriate response based on whether we're interrupted
+    return {
+        "thread_id": thread_id,
+        "message": message,
+        "answer": final_answer,
+        "status": "interrupted" if is_interrupted else "completed",
+        "interrupt_message": "Proporcione su feedback o escriba 'done' para finalizar" if is_interrupted else None
+    }
+
+
+def _build_error_response(thread_id: str, message: str, e: Exception) -> Dict[str, Any]:
+    """Log a failed turn and build the user-facing error response for its channel."""
+    error_detail = str(e) if str(e) else "Unknown error (empty exception message)"
+    stack_trace = traceback.format_exc()
+    logger.error(f"Error processing message for thread {thread_id}: {error_detail}")
+    logger.error(f"Stack trace: {stack_trace}")
+
+    # Return user-friendly error based on channel
+    error_message = "I'm sorry, I encountered an error. Technical details: " + error_detail
+    if thread_id.startswith("whatsapp_"):
+        error_message = "Disculpa, encontré un problema técnico. Por favor intenta nuevamente."
+
+    return {
+        "thread_id": thread_id,
+        "message": message,
+        "answer": error_message,
+        "error": error_detail,
+        "status": "error",
+        "channel": "whatsapp" if thread_id.startswith("whatsapp_") else "api"
+    }
+
+
 def process_message(
         message: str,
         thread_id: str,
@@ -33,55 +237,22 @@ def process_message(
         # Detectar si es un thread de WhatsApp
         is_whatsapp = thread_id.startswith("whatsapp_")
 
-        # Create the Supervisor PYMES graph
-        logger.info(f"Creating Supervisor PYMES graph for thread {thread_id} (WhatsApp: {is_whatsapp})")
+        # Get the shared Supervisor PYMES graph
+        logger.info(f"Using Supervisor PYMES graph for thread {thread_id} (WhatsApp: {is_whatsapp})")
         graph = create_supervisor_pymes_graph()
         logger.info(f"Supervisor PYMES graph created successfully for thread {thread_id}")
 
-        # Set up configuration with the thread_id and recursion limit
-        config = {
-            "configurable": {
-                "thread_id": thread_id,
-                "reset_thread": reset_thread
-            },
-            "recursion_limit": 100  # Aumentar límite de recursión para evitar errores
-        }
+        config = _build_config(thread_id, reset_thread)
 
         # Check if we're resuming from an interrupt
+        history_length = None
         if is_resuming:
             logger.info(f"Resuming graph execution for thread {thread_id}")
-            # Use Command to resume with the user's message
-            graph_input = Command(resume=message)
         else:
             logger.info(f"Starting new graph execution for thread {thread_id}")
+            history_length = _get_history_length(graph, config)
 
-            # Try to get existing state for non-reset conversations
-            state = None
-            if not reset_thread:
-                try:
-                    state = graph.get_state(config)
-                    logger.info(f"Retrieved existing state for thread {thread_id}")
-                except Exception as e:
-                    logger.info(f"No existing state found for thread {thread_id}: {str(e)}")
-
-            # Prepare the initial state
-            initial_state = {
-                "input": message,
-                "messages": [HumanMessage(content=message)],
-                "business_info": {},
-                "growth_goals": {},
-                "business_challenges": {},
-                "stage": "info_gathering",
-                "growth_proposal": None,
-                "context": "",
-                "summary": "",
-                "web_search": None,
-                "documents": None,
-                "answer": "",
-                "human_feedback": []
-            }
-
-            graph_input = initial_state
+        graph_input = _build_graph_input(message, is_resuming, history_length, reset_thread)
 
         # Execute the graph
         try:
@@ -96,115 +267,177 @@ def process_message(
         # Get the current state after execution
         state = graph.get_state(config)
 
-        # Check if we're in an interrupt state
-        is_interrupted = False
-        interrupt_data = None
-        
-        # Check for interrupts in the state
-        if hasattr(state, 'tasks') and state.tasks:
-            for task in state.tasks:
-                if hasattr(task, 'interrupts') and task.interrupts:
-                    is_interrupted = True
-                    interrupt_data = task.interrupts[0] if task.interrupts else None
-                    logger.info(f"Graph interrupted with data: {interrupt_data}")
-                    break
-        
-        # Fallback: check if next node is human_feedback
-        if not is_interrupted and state.next and any("human_feedback" in node for node in state.next):
-            is_interrupted = True
-            logger.info(f"Graph interrupted at human_feedback for thread {thread_id}")
-
-        # --- Obtener estado y comprobar interrupción ---
         # Obtener el checkpoint MÁS RECIENTE (que ahora sabemos es un dict)
         latest_checkpoint_dict: Optional[Dict] = graph.checkpointer.get(config)
         if not latest_checkpoint_dict:
             logger.error(f"[Thread: {thread_id}] CRITICAL: Checkpoint dictionary not found after invocation.")
             return {"status": "error", "error": "Checkpoint dict retrieval failed"}
 
-        # *** CORRECCIÓN DEFINITIVA AQUÍ ***
         # Acceder directamente a la clave 'channel_values' del diccionario
-        final_state_values: Dict[str, Any] = latest_checkpoint_dict.get('channel_values', {})  # Usa .get para seguridad
-        # *********************************
-
-        # Obtener 'next' del StateSnapshot (esto sigue igual)
-        state_snapshot = graph.get_state(config)
-        next_nodes = state_snapshot.next
-        logger.info(f"[Thread: {thread_id}] Latest state retrieved. Next nodes: {next_nodes}")
-
-        # --- Extraer la respuesta final (usando final_state_values) ---
-        final_answer = "El asistente no generó una respuesta en este turno."
-        
-        # Si hay una interrupción, usar los datos de la interrupción
-        if is_interrupted and interrupt_data:
-            try:
-                # interrupt_data es un objeto Interrupt de LangGraph
-                if hasattr(interrupt_data, 'value') and isinstance(interrupt_data.value, dict):
-                    interrupt_value = interrupt_data.value
-                    if 'answer' in interrupt_value:
-                        final_answer = interrupt_value['answer']
-                        logger.info(f"[Thread: {thread_id}] Using interrupt answer: {final_answer[:100]}...")
-                    else:
-                        logger.info(f"[Thread: {thread_id}] Interrupt value keys: {list(interrupt_value.keys())}")
-                elif isinstance(interrupt_data, dict) and 'answer' in interrupt_data:
-                    final_answer = interrupt_data['answer']
-                    logger.info(f"[Thread: {thread_id}] Using interrupt answer: {final_answer[:100]}...")
-                else:
-                    logger.info(f"[Thread: {thread_id}] Interrupt data format: {type(interrupt_data)}")
-            except Exception as e:
-                logger.error(f"[Thread: {thread_id}] Error extracting interrupt data: {str(e)}")
-        
-        # Si no hay datos de interrupción, buscar en los mensajes
-        if final_answer == "El asistente no generó una respuesta en este turno.":
-            # Usar .get() en el diccionario final_state_values
-            all_messages: List[BaseMessage] = final_state_values.get("messages", [])
-            # ***********************
-            if all_messages:
-                # Search for the last AI message that's not an error message
-                for msg in reversed(all_messages):
-                    if isinstance(msg, AIMessage):
-                        # Skip error messages from human_feedback_node
-                        if "Error procesando entrada" not in msg.content:
-                            final_answer = msg.content
-                            logger.info(f"[Thread: {thread_id}] Found last AI message content.")
-                            break
-                    # Handle other potential message formats
-                    elif hasattr(msg, 'role') and msg.get('role') == 'ai':
-                        content = msg.get('content', 'No content found')
-                        if "Error procesando entrada" not in content:
-                            final_answer = content
-                            logger.info(f"[Thread: {thread_id}] Found last AI message from role.")
-                            break
-            else:
-                logger.warning(f"[Thread: {thread_id}] No messages found in final state values.")
+        return _build_turn_response(thread_id, message, state, latest_checkpoint_dict.get('channel_values', {}))
 
-        # Return appropriate response based on whether we're interrupted
-        return {
-            "thread_id": thread_id,
-            "message": message,
-            "answer": final_answer,
-            "status": "interrupted" if is_interrupted else "completed",
-            "interrupt_message": "Proporcione su feedback o escriba 'done' para finalizar" if is_interrupted else None
-        }
+    except Exception as e:
+        return _build_error_response(thread_id, message, e)
+
+
+async def aprocess_message(
+        message: str,
+        thread_id: str,
+        is_resuming: bool = False,
+        reset_thread: bool = False
+) -> Dict[str, Any]:
+    """
+    Async version of process_message.
+    Runs the graph compiled with the async Postgres checkpointer so checkpoint
+    reads and writes don't block the event loop of the calling endpoint.
+
+    Args:
+        message: The user's message
+        thread_id: A unique identifier for this conversation thread
+        is_resuming: Whether this is resuming after an interrupt
+        reset_thread: Whether to reset the thread and start a new conversation
+
+    Returns:
+        dict: The result containing answer, status (completed/interrupted), and thread_id
+    """
+    try:
+        logger.info(f"Using async Supervisor PYMES graph for thread {thread_id}")
+        graph = await acreate_supervisor_pymes_graph()
+
+        config = _build_config(thread_id, reset_thread)
+        history_length = None if is_resuming else await _aget_history_length(graph, config)
+        graph_input = _build_graph_input(message, is_resuming, history_length, reset_thread)
+
+        try:
+            logger.info(f"Invoking graph for thread {thread_id}")
+            await graph.ainvoke(graph_input, config)
+            logger.info(f"Graph execution completed or paused for thread {thread_id}")
+        except Exception as graph_error:
+            logger.error(f"Error during graph execution: {str(graph_error)}")
+            logger.error(f"Graph execution traceback: {traceback.format_exc()}")
+            raise graph_error
+
+        state = await graph.aget_state(config)
+
+        latest_checkpoint_dict: Optional[Dict] = await graph.checkpointer.aget(config)
+        if not latest_checkpoint_dict:
+            logger.error(f"[Thread: {thread_id}] CRITICAL: Checkpoint dictionary not found after invocation.")
+            return {"status": "error", "error": "Checkpoint dict retrieval failed"}
+
+        return _build_turn_response(thread_id, message, state, latest_checkpoint_dict.get('channel_values', {}))
 
     except Exception as e:
-        error_detail = str(e) if str(e) else "Unknown error (empty exception message)"
-        stack_trace = traceback.format_exc()
-        logger.error(f"Error processing message for thread {thread_id}: {error_detail}")
-        logger.error(f"Stack trace: {stack_trace}")
+        return _build_error_response(thread_id, message, e)
+
+
+def stream_message(
+        message: str,
+        thread_id: str,
+        is_resuming: bool = False,
+        reset_thread: bool = False
+) -> Iterator[str]:
+    """
+    Stream the assistant's answer token by token while the graph runs.
+
+    Uses LangGraph's ``stream_mode="messages"`` so the tokens produced by the
+    agents (including the ones running inside the ReAct subgraphs) reach the
+    client before the LLM call completes. The graph, checkpointer and interrupt
+    handling are the same as in ``process_message``; once the stream ends the
+    thread can be resumed with ``is_resuming=True``.
+
+    Args:
+        message: The user's message
+        thread_id: A unique identifier for this conversation thread
+        is_resuming: Whether this is resuming after an interrupt
+        reset_thread: Whether to reset the thread and start a new conversation
+
+    Yields:
+        str: Text chunks of the assistant's response
+    """
+    try:
+        logger.info(f"Streaming Supervisor PYMES graph for thread {thread_id}")
+        graph = create_supervisor_pymes_graph()
+        config = _build_config(thread_id, reset_thread)
+        history_length = None if is_resuming else _get_history_length(graph, config)
+        graph_input = _build_graph_input(message, is_resuming, history_length, reset_thread)
+
+        for _namespace, (chunk, metadata) in graph.stream(
+                graph_input, config, stream_mode="messages", subgraphs=True
+        ):
+            if not isinstance(chunk, AIMessage) or not isinstance(chunk.content, str):
+                continue
+            if chunk.content and metadata.get("langgraph_node") in STREAMING_NODES:
+                yield chunk.content
+
+        logger.info(f"Streaming completed or paused for thread {thread_id}")
 
-        # Return user-friendly error based on channel
-        error_message = "I'm sorry, I encountered an error. Technical details: " + error_detail
+    except Exception as e:
+        logger.error(f"Error streaming message for thread {thread_id}: {str(e)}")
+        logger.error(f"Stack trace: {traceback.format_exc()}")
         if thread_id.startswith("whatsapp_"):
-            error_message = "Disculpa, encontré un problema técnico. Por favor intenta nuevamente."
+            yield "Disculpa, encontré un problema técnico. Por favor intenta nuevamente."
+        else:
+            yield "I'm sorry, I encountered an error. Technical details: " + str(e)
 
-        return {
-            "thread_id": thread_id,
-            "message": message,
-            "answer": error_message,
-            "error": error_detail,
-            "status": "error",
-            "channel": "whatsapp" if thread_id.startswith("whatsapp_") else "api"
-        }
+
+async def astream_message(
+        message: str,
+        thread_id: str,
+        is_resuming: bool = False,
+        reset_thread: bool = False
+) -> AsyncIterator[str]:
+    """
+    Async version of stream_message.
+    Streams from the graph compiled with the async Postgres checkpointer, so
+    the endpoint forwards tokens without tying up a worker thread per stream.
+
+    Args:
+        message: The user's message
+        thread_id: A unique identifier for this conversation thread
+        is_resuming: Whether this is resuming after an interrupt
+        reset_thread: Whether to reset the thread and start a new conversation
+
+    Yields:
+        str: Text chunks of the assistant's response
+    """
+    try:
+        logger.info(f"Streaming async Supervisor PYMES graph for thread {thread_id}")
+        graph = await acreate_supervisor_pymes_graph()
+        config = _build_config(thread_id, reset_thread)
+        history_length = None if is_resuming else await _aget_history_length(graph, config)
+        graph_input = _build_graph_input(message, is_resuming, history_length, reset_thread)
+
+        async for _namespace, (chunk, metadata) in graph.astream(
+                graph_input, config, stream_mode="messages", subgraphs=True
+        ):
+            if not isinstance(chunk, AIMessage) or not isinstance(chunk.content, str):
+                continue
+            if chunk.content and metadata.get("langgraph_node") in STREAMING_NODES:
+                yield chunk.content
+
+        logger.info(f"Streaming completed or paused for thread {thread_id}")
+
+    except Exception as e:
+        logger.error(f"Error streaming message for thread {thread_id}: {str(e)}")
+        logger.error(f"Stack trace: {traceback.format_exc()}")
+        if thread_id.startswith("whatsapp_"):
+            yield "Disculpa, encontré un problema técnico. Por favor intenta nuevamente."
+        else:
+            yield "I'm sorry, I encountered an error. Technical details: " + str(e)
+
+
+def _get_archived_messages(graph, thread_id: str) -> List[BaseMessage]:
+    """Messages moved out of the checkpoint by the supervisor graph, oldest first."""
+    try:
+        items = graph.store.search((HISTORY_NAMESPACE, thread_id), limit=ARCHIVE_SEARCH_LIMIT)
+    except Exception as e:
+        logger.error(f"Error retrieving archived history for thread {thread_id}: {str(e)}")
+        return []
+
+    archived: List[BaseMessage] = []
+    for item in sorted(items, key=lambda item: item.key):
+        archived.extend(messages_from_dict(item.value.get("messages", [])))
+    return archived
 
 
 async def get_chat_history(thread_id: str) -> List[Dict[str, Any]]:
@@ -222,8 +455,8 @@ async def get_chat_history(thread_id: str) -> List[Dict[str, Any]]:
         is_whatsapp = thread_id.startswith("whatsapp_")
         logger.info(f"Retrieving chat history for thread {thread_id} (WhatsApp: {is_whatsapp})")
 
-        # Create the chat graph to access its API
-        graph = create_chat_graph()
+        # Get the shared chat graph to access its API
+        graph = create_supervisor_pymes_graph()
 
         # Create a configuration for the thread
         config = {"configurable": {"thread_id": thread_id}}
@@ -237,8 +470,8 @@ async def get_chat_history(thread_id: str) -> List[Dict[str, Any]]:
             logger.error(traceback.format_exc())
             return []
 
-        # Extract chat history from the values
-        chat_history = state_snapshot.values.get("messages", [])
+        # Extract chat history from the values, preceded by the blocks archived in the store
+        chat_history = _get_archived_messages(graph, thread_id) + state_snapshot.values.get("messages", [])
 
         if not chat_history:
             logger.info(f"Empty chat history for thread {thread_id}")
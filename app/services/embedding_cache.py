@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config.settings import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that never sends the same text to the provider twice.
+
+    Vectors are stored in a SQLite table keyed by (sha256(text), provider, model),
+    so they survive restarts, with a small in-process LRU in front of it.
+    Only the texts missing from both layers reach the underlying model.
+    """
+
+    def __init__(self, underlying: Embeddings, path: str = EMBEDDING_CACHE_PATH,
+                 memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.underlying = underlying
+        self.provider = type(underlying).__name__
+        self.model = getattr(underlying, "model", "")
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "hash TEXT, provider TEXT, model TEXT, vector BLOB, "
+            "PRIMARY KEY (hash, provider, model))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for the given hashes, memory first, then SQLite."""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if missing:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embedding_cache "
+                    f"WHERE provider = ? AND model = ? AND hash IN ({placeholders})",
+                    (self.provider, self.model, *missing)
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> Dict[str, np.ndarray]:
+        """Persist freshly computed vectors and return them as float32 arrays."""
+        arrays = {key: np.asarray(vector, dtype=np.float32) for key, vector in vectors.items()}
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (hash, provider, model, vector) VALUES (?, ?, ?, ?)",
+                [(key, self.provider, self.model, array.tobytes()) for key, array in arrays.items()]
+            )
+            self._conn.commit()
+            for key, array in arrays.items():
+                self._remember(key, array)
+        return arrays
+
+    def _split(self, texts: List[str]):
+        keys = [self._hash(text) for text in texts]
+        found = self._lookup(keys)
+        misses = {key: text for key, text in zip(keys, texts) if key not in found}
+        if found:
+            logger.debug(f"🎯 Embedding cache: {len(texts) - len(misses)}/{len(texts)} hits")
+        return keys, found, misses
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, misses = self._split(texts)
+        if misses:
+            computed = self.underlying.embed_documents(list(misses.values()))
+            found.update(self._store(dict(zip(misses, computed))))
+        return [found[key].tolist() for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, misses = self._split(texts)
+        if misses:
+            computed = await self.underlying.aembed_documents(list(misses.values()))
+            found.update(self._store(dict(zip(misses, computed))))
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
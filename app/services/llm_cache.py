@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from app.config.settings import LLM_CACHE_PATH, LLM_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteTTLCache(BaseCache):
+    """
+    Persistent LangChain LLM cache with expiry.
+
+    Responses are stored in SQLite under sha256(llm_string + prompt); llm_string
+    already carries the model name and temperature, so a different model or
+    sampling setup never reuses an answer. Entries older than ``ttl`` are ignored.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, ts REAL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}|{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, ts FROM llm_cache WHERE key = ?", (self._key(prompt, llm_string),)
+            ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+
+        try:
+            generations = [loads(item, allowed_objects="core") for item in json.loads(row[0])]
+        except Exception as e:
+            logger.warning(f"Entrada de caché LLM ilegible, se ignora: {str(e)}")
+            return None
+        logger.info("🎯 Respuesta del LLM servida desde caché persistente")
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        value = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, ts) VALUES (?, ?, ?)",
+                (self._key(prompt, llm_string), value, time.time())
+            )
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+@lru_cache
+def get_llm_cache() -> SQLiteTTLCache:
+    """Get the persistent LLM response cache shared by the research calls."""
+    return SQLiteTTLCache()
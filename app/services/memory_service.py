@@ -2,6 +2,7 @@ import logging
 import json
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+from functools import lru_cache
 from uuid import uuid4
 
 from langchain_core.documents import Document
@@ -39,7 +40,7 @@ class MemoryService:
         try:
             # Verificar si Qdrant está disponible
             collections = self.qdrant_client.get_collections().collections
-            collection_names = [col.name for col in collections]
+            collection_names = {col.name for col in collections}
             
             for collection_name in [self.business_collection, self.research_collection]:
                 if collection_name not in collection_names:
@@ -478,12 +479,7 @@ class MemoryService:
             return []
 
 
-# Singleton para el servicio de memoria
-_memory_service = None
-
+@lru_cache
 def get_memory_service() -> MemoryService:
-    """Obtiene o crea una instancia singleton del servicio de memoria."""
-    global _memory_service
-    if _memory_service is None:
-        _memory_service = MemoryService()
-    return _memory_service 
\ No newline at end of file
+    """Obtiene la instancia compartida del servicio de memoria (un solo cliente de Qdrant por proceso)."""
+    return MemoryService()
@@ -0,0 +1,77 @@
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from langchain_core.messages import BaseMessage
+from langchain_openai import OpenAIEmbeddings
+
+from app.config.settings import (
+    EMBEDDING_MODEL,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MAX_PARTITIONS,
+    SEMANTIC_CACHE_TTL
+)
+from app.utils.cache import SemanticCache, TTLCache
+from app.utils.serialization import stable_json
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """
+    Caché semántica de respuestas del consultor.
+
+    Solo se embebe el mensaje del usuario normalizado; la información del negocio
+    y el historial reciente no se mezclan en el embedding (dominarían la similitud),
+    sino que particionan la caché por su hash exacto. Una respuesta solo se
+    reutiliza para una pregunta parecida (similitud coseno >= threshold) del mismo
+    negocio y en el mismo punto de la conversación.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 max_partitions: int = SEMANTIC_CACHE_MAX_PARTITIONS, ttl: float = SEMANTIC_CACHE_TTL):
+        self.embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._partitions = TTLCache(maxsize=max_partitions, ttl=ttl)
+
+    @staticmethod
+    def normalize_message(user_message: str) -> str:
+        """Mensaje en minúsculas y con los espacios colapsados."""
+        return " ".join(user_message.casefold().split())
+
+    @staticmethod
+    def partition_key(business_info: Dict[str, Any], history: List[BaseMessage]) -> str:
+        """Hash exacto de la información del negocio y del historial previo a la pregunta."""
+        payload = stable_json({
+            "business_info": business_info or {},
+            "history": [(message.type, message.content) for message in history],
+        })
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def embed(self, user_message: str) -> np.ndarray:
+        """Devuelve el embedding normalizado del mensaje del usuario."""
+        return SemanticCache.normalize(self.embeddings.embed_query(self.normalize_message(user_message)))
+
+    def lookup(self, partition: str, vector: np.ndarray) -> Optional[str]:
+        """Busca el vecino más cercano dentro de la partición y devuelve su respuesta si supera el umbral."""
+        cache = self._partitions.get(partition)
+        return cache.lookup(vector) if cache is not None else None
+
+    def add(self, partition: str, vector: np.ndarray, response: str) -> None:
+        """Añade una respuesta a la partición, descartando la más antigua si está llena."""
+        cache = self._partitions.get(partition)
+        if cache is None:
+            cache = SemanticCache(threshold=self.threshold, max_entries=self.max_entries, ttl=self.ttl)
+            self._partitions.set(partition, cache)
+        cache.add(vector, response)
+
+
+@lru_cache
+def get_response_cache() -> SemanticResponseCache:
+    """Get a SemanticResponseCache instance."""
+    return SemanticResponseCache()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional, Set, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Type variable for coroutine return types
+T = TypeVar('T')
+
+# Singleton background event loop
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the shared background event loop, starting it on first use.
+
+    The loop runs forever in a daemon thread so synchronous code can hand it
+    coroutines without creating a new thread and event loop per call.
+    """
+    global _background_loop
+
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="async-background-loop", daemon=True)
+                thread.start()
+                _background_loop = loop
+                logger.info("Background event loop started")
+
+    return _background_loop
+
+
+def run_coroutine_sync(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine from synchronous code and wait for its result.
+
+    Works whether or not the calling thread already has a running event loop,
+    since the coroutine is executed on the shared background loop.
+
+    Args:
+        coro: The coroutine to run
+        timeout: Maximum seconds to wait for the result
+
+    Returns:
+        The coroutine's result
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_background_loop())
+    return future.result(timeout)
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent calls into batches.
+
+    Items submitted within ``max_wait`` seconds of each other (up to
+    ``max_batch_size``) are handed to ``batch_fn`` together; each caller gets
+    back the result at its own position. Batching happens on the event loop
+    that first used the batcher; calls from any other loop run unbatched.
+    """
+
+    def __init__(
+            self,
+            batch_fn: Callable[[List[Any]], Awaitable[List[T]]],
+            max_batch_size: int = 8,
+            max_wait: float = 0.05
+    ):
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> T:
+        """Queue an item and wait for its result."""
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        if loop is not self._loop or self.max_batch_size <= 1:
+            return (await self._batch_fn([item]))[0]
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Send everything queued so far as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self._batch_fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logger.debug("Micro-batch of %d items processed", len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
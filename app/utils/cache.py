@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    Used to memoize expensive calls (LLM, web search) for identical inputs
+    within a short window.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value for key, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Remove key and return its value, or default if missing or expired."""
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SemanticCache:
+    """
+    Thread-safe nearest-neighbour cache over L2-normalized vectors.
+
+    ``lookup`` returns the value stored with the most similar vector when the
+    cosine similarity reaches ``threshold`` and the entry has not expired.
+    Entries live in a preallocated ring buffer: when full, the oldest one is
+    overwritten instead of copying the matrix on every insert.
+    """
+
+    def __init__(self, threshold: float, max_entries: int = 1000, ttl: Optional[float] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors: Optional[np.ndarray] = None
+        self._expires = np.full(max_entries, np.inf)
+        self._values: List[Any] = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(vector) -> np.ndarray:
+        """Return vector as a float32 array with unit norm."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: np.ndarray) -> Optional[Any]:
+        """Return the value of the nearest live neighbour if it clears the threshold."""
+        with self._lock:
+            if not self._size:
+                return None
+            similarities = self._vectors[:self._size] @ vector
+            if self.ttl is not None:
+                similarities[self._expires[:self._size] < time.monotonic()] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                logger.info(f"🎯 Semantic cache hit (similarity={similarities[best]:.3f})")
+                return self._values[best]
+        return None
+
+    def add(self, vector: np.ndarray, value: Any) -> None:
+        """Store value under vector, overwriting the oldest entry when full."""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self._vectors[self._next] = vector
+            self._values[self._next] = value
+            self._expires[self._next] = time.monotonic() + self.ttl if self.ttl is not None else np.inf
+            self._next = (self._next + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._values = [None] * self.max_entries
+            self._size = 0
+            self._next = 0
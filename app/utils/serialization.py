@@ -0,0 +1,12 @@
+import json
+from typing import Any
+
+
+def stable_json(data: Any) -> str:
+    """
+    Serialize data as deterministic JSON (sorted keys, UTF-8 kept as is).
+
+    Equal data always yields the same text, unlike a dict repr, so it is safe
+    to use both in prompts (provider prefix caching) and in cache keys.
+    """
+    return json.dumps(data if data is not None else {}, sort_keys=True, ensure_ascii=False, default=str)
@@ -8,6 +8,7 @@ from app.config.settings import API_HOST, API_PORT, API_WORKERS, LOG_LEVEL
 from app.database.postgres import check_postgres_connection, close_postgres_connections
 from app.database.engine import close_connections
 from app.database.init_db import init_db
+from app.graph.supervisor_architecture import warmup_agents
 
 # Setup logging
 logging_level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
@@ -83,6 +84,10 @@ async def startup_event():
         else:
             logger.error("PostgreSQL connection failed")
 
+        # Build the ReAct agents up front
+        logger.info("Initializing agents...")
+        warmup_agents()
+
     except Exception as e:
         logger.error(f"Error initializing services: {str(e)}")
         # We don't want to crash the app if services fail to initialize
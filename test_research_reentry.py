@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Pruebas del sub-grafo de investigación con las cachés activas, sin red.
+
+Este archivo prueba:
+1. "MÁS INFORMACIÓN" vuelve a investigar (nuevas consultas, nuevo análisis) aunque
+   el LLM tenga caché y business_info no cambie
+2. La investigación especulativa se consume una sola vez, una fallida no se conserva
+   y una corrección del usuario la descarta
+3. La herramienta search y search_many comparten la caché de resultados de Tavily
+4. search_many funciona desde dos event loops distintos
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import Future
+from unittest import mock
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.caches import InMemoryCache
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Command
+
+from app.graph import nodes
+from app.graph import research_subgraph as research
+from app.graph.state import PYMESState
+
+BUSINESS_INFO = {
+    "nombre_empresa": "FoodTech",
+    "sector": "Restaurantes",
+    "ubicacion": "Lima",
+}
+
+
+def _fake_agent(responses):
+    """ResearchAgent con un modelo falso (con caché) que devuelve las respuestas en orden."""
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content=text) for text in responses]), cache=InMemoryCache())
+    with mock.patch.object(research, "get_research_llm", return_value=llm):
+        return research.ResearchAgent()
+
+
+def _fake_search(queries):
+    """Búsqueda sin red: un resultado por consulta, con el texto de la consulta."""
+    return [[{"url": f"https://example.com/{query}", "content": f"contenido {query}", "title": query}] for query in queries]
+
+
+class _SyncExecutor:
+    """Executor que ejecuta la tarea al enviarla: el Future ya está resuelto (y sus callbacks corridos)."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def _build_research_graph():
+    """Mismo flujo que create_research_subgraph, con checkpointer para poder reanudar tras interrupt."""
+    workflow = StateGraph(PYMESState)
+    workflow.add_node("research_opportunities", research.research_opportunities_runnable)
+    workflow.add_node("validate_research_results", research.validate_research_results_node)
+    workflow.add_edge(START, "research_opportunities")
+    workflow.add_edge("research_opportunities", "validate_research_results")
+    workflow.add_edge("validate_research_results", END)
+    return workflow.compile(checkpointer=MemorySaver())
+
+
+def test_more_information_runs_research_again():
+    """Prueba 1: la re-entrada por "MÁS INFORMACIÓN" produce un análisis nuevo."""
+    agent = _fake_agent(["- consulta uno", "análisis #1", "- consulta dos", "análisis #2"])
+    searched = []
+
+    def search_opportunities(queries):
+        searched.append(list(queries))
+        return [dict(result, query=query) for query, results in zip(queries, _fake_search(queries)) for result in results]
+
+    research._speculative_research.clear()
+    graph = _build_research_graph()
+    config = {"configurable": {"thread_id": "test_research_reentry"}}
+
+    with mock.patch.object(research, "get_research_agent", return_value=agent), \
+            mock.patch.object(agent, "search_opportunities", side_effect=search_opportunities):
+        graph.invoke({"business_info": BUSINESS_INFO, "messages": []}, config)
+        assert graph.get_state(config).values["context"] == "análisis #1"
+
+        graph.invoke(Command(resume="MÁS INFORMACIÓN sobre delivery"), config)
+        state = graph.get_state(config)
+
+    assert state.values["context"] == "análisis #2"
+    assert searched == [["consulta uno"], ["consulta dos"]]
+    # El grafo vuelve a esperar la validación del nuevo análisis
+    assert state.next == ("validate_research_results",)
+
+
+def test_speculative_research_is_consumed_once():
+    """Prueba 2: el resultado especulativo se usa una vez; fallos y correcciones no se guardan."""
+    calls = []
+
+    def run_research(business_info, follow_up=""):
+        calls.append(follow_up)
+        if len(calls) == 1:
+            raise RuntimeError("fallo especulativo")
+        return [], f"análisis #{len(calls)}"
+
+    research._speculative_research.clear()
+    key = research._business_info_key(BUSINESS_INFO)
+
+    with mock.patch.object(research, "_run_research", side_effect=run_research), \
+            mock.patch.object(research, "_research_executor", _SyncExecutor()):
+        research.start_speculative_research(BUSINESS_INFO)
+        assert research._speculative_research.get(key) is None
+
+        research.start_speculative_research(BUSINESS_INFO)
+        first = research.research_opportunities_node({"business_info": BUSINESS_INFO, "messages": []})
+        second = research.research_opportunities_node({"business_info": BUSINESS_INFO, "messages": []})
+
+        research.start_speculative_research(BUSINESS_INFO)
+        research.discard_speculative_research(BUSINESS_INFO)
+
+    assert first["context"] == "análisis #2"
+    assert second["context"] == "análisis #3"
+    assert calls == ["", "", "", ""]
+    assert len(research._speculative_research) == 0
+
+
+def test_search_tool_and_search_many_share_cache():
+    """Prueba 3: una consulta resuelta por search_many no vuelve a la red desde la herramienta."""
+
+    class FakeAsyncClient:
+        async def search(self, query, max_results):
+            return {"results": _fake_search([query])[0]}
+
+    nodes._search_results_cache.clear()
+    tool = mock.Mock()
+
+    with mock.patch.object(nodes, "get_async_tavily_client", return_value=FakeAsyncClient()), \
+            mock.patch.object(nodes, "get_tavily_search_tool", return_value=tool):
+        from app.utils.async_utils import run_coroutine_sync
+        run_coroutine_sync(nodes.search_many(["Tendencias  Delivery"]))
+        output = nodes.search.invoke({"query": "tendencias delivery"})
+
+    tool.invoke.assert_not_called()
+    assert "https://example.com/Tendencias  Delivery" in output
+
+
+def test_search_many_works_from_two_event_loops():
+    """Prueba 4: el loop de fondo y otro loop (p. ej. el de FastAPI) no comparten cliente Tavily."""
+
+    class LoopBoundClient:
+        """Como httpx.AsyncClient: queda ligado al primer loop en el que se usa."""
+
+        def __init__(self, api_key=None):
+            self.loop = None
+
+        async def search(self, query, max_results):
+            loop = asyncio.get_running_loop()
+            self.loop = self.loop or loop
+            if self.loop is not loop:
+                raise RuntimeError("bound to a different event loop")
+            return {"results": _fake_search([query])[0]}
+
+    nodes._search_results_cache.clear()
+    with mock.patch("tavily.AsyncTavilyClient", LoopBoundClient):
+        from app.utils.async_utils import run_coroutine_sync
+        background = run_coroutine_sync(nodes.search_many(["consulta fondo"]))
+        other = asyncio.run(nodes.search_many(["consulta otro loop"]))
+
+    assert background[0][0]["url"] == "https://example.com/consulta fondo"
+    assert other[0][0]["url"] == "https://example.com/consulta otro loop"
+
+
+if __name__ == "__main__":
+    print("🧪 Ejecutando pruebas del sub-grafo de investigación...")
+    for test in (test_more_information_runs_research_again,
+                 test_speculative_research_is_consumed_once,
+                 test_search_tool_and_search_many_share_cache,
+                 test_search_many_works_from_two_event_loops):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Pruebas del estado que se conserva entre turnos, sin red ni Postgres.
+
+Este archivo prueba:
+1. La entrada de un turno normal no sobrescribe business_info, stage ni context
+2. reset_thread=True sí reinicia el estado de la conversación
+3. El supervisor guarda el mismo estado con cualquier nivel de logging
+4. Las respuestas triviales se clasifican igual en todos los nodos
+5. La caché semántica no reutiliza respuestas de otra pregunta, negocio o historial
+"""
+
+import logging
+import os
+import sys
+from typing import Any, Dict
+from unittest import mock
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+
+from app.graph import supervisor_architecture
+from app.graph.state import (
+    PYMESState,
+    get_last_user_input,
+    is_acknowledgement,
+    is_no_data_reply,
+    is_termination_reply
+)
+from app.services import response_cache
+from app.services.chat_service import _build_graph_input
+
+BUSINESS_INFO = {"nombre_empresa": "FoodTech", "sector": "Restaurantes"}
+
+
+def _build_turn_graph():
+    """Grafo mínimo: el primer turno registra el negocio, los siguientes solo leen el estado."""
+    def node(state: PYMESState) -> Dict[str, Any]:
+        if not state.get("business_info"):
+            return {"business_info": BUSINESS_INFO, "stage": "conversation", "context": "análisis previo"}
+        return {}
+
+    workflow = StateGraph(PYMESState)
+    workflow.add_node("node", node)
+    workflow.add_edge(START, "node")
+    workflow.add_edge("node", END)
+    return workflow.compile(checkpointer=MemorySaver())
+
+
+def test_turn_input_keeps_checkpointed_state():
+    """Prueba 1: el segundo turno conserva lo guardado en el primero."""
+    graph = _build_turn_graph()
+    config = {"configurable": {"thread_id": "test_turn_state_001"}}
+
+    graph.invoke(_build_graph_input("Hola", is_resuming=False, history_length=0), config)
+    state = graph.invoke(_build_graph_input("Somos de Lima", is_resuming=False, history_length=1), config)
+
+    assert state["business_info"] == BUSINESS_INFO
+    assert state["stage"] == "conversation"
+    assert state["context"] == "análisis previo"
+    assert [message.content for message in state["messages"]] == ["Hola", "Somos de Lima"]
+    assert state["last_human_idx"] == 1
+    assert get_last_user_input(state) == "Somos de Lima"
+
+
+def test_reset_thread_clears_state():
+    """Prueba 2: reset_thread=True reinicia business_info y stage."""
+    turn_input = _build_graph_input("Hola", is_resuming=False, history_length=0, reset_thread=True)
+
+    assert turn_input["business_info"] == {}
+    assert turn_input["stage"] == "info_gathering"
+    assert isinstance(turn_input["messages"][0], HumanMessage)
+
+
+def test_supervisor_update_does_not_depend_on_log_level():
+    """Prueba 3: el update del supervisor es el mismo con DEBUG y con INFO."""
+    state = {"business_info": {}, "messages": [HumanMessage(content="Hola")]}
+    logger = supervisor_architecture.logger
+    previous_level = logger.level
+    try:
+        logger.setLevel(logging.DEBUG)
+        debug_update = supervisor_architecture.supervisor_node(state)
+        logger.setLevel(logging.INFO)
+        info_update = supervisor_architecture.supervisor_node(state)
+    finally:
+        logger.setLevel(previous_level)
+
+    assert debug_update == info_update
+    assert info_update["last_handoff"]
+
+
+def test_trivial_replies_share_one_definition():
+    """Prueba 4: despedidas, acuses de recibo y respuestas sin datos."""
+    assert is_termination_reply("Chao")
+    assert is_acknowledgement("  OK!! ")
+    assert is_acknowledgement("Muchas  gracias.")
+    assert is_no_data_reply("Sí")
+    assert is_no_data_reply("listo")
+    assert not is_no_data_reply("Lima")
+    assert not is_acknowledgement("no")
+
+
+def test_semantic_cache_is_partitioned_by_business_and_history():
+    """Prueba 5: solo la pregunta se embebe; negocio e historial particionan la caché."""
+    vectors = {"¿cómo vendo más?": [1.0, 0.0], "¿qué precio pongo?": [0.0, 1.0]}
+    embeddings = mock.Mock()
+    embeddings.embed_query.side_effect = lambda text: vectors[text]
+
+    with mock.patch.object(response_cache, "OpenAIEmbeddings", return_value=embeddings):
+        cache = response_cache.SemanticResponseCache(threshold=0.9)
+
+    history = [HumanMessage(content="Hola"), AIMessage(content="¿En qué te ayudo?")]
+    partition = cache.partition_key(BUSINESS_INFO, history)
+    cache.add(partition, cache.embed("¿Cómo  vendo más?"), "respuesta ventas")
+
+    assert cache.lookup(partition, cache.embed("¿cómo vendo MÁS?")) == "respuesta ventas"
+    assert cache.lookup(partition, cache.embed("¿Qué precio pongo?")) is None
+    assert cache.partition_key(dict(BUSINESS_INFO), list(history)) == partition
+    assert cache.lookup(cache.partition_key({**BUSINESS_INFO, "ubicacion": "Lima"}, history),
+                        cache.embed("¿cómo vendo más?")) is None
+    assert cache.lookup(cache.partition_key(BUSINESS_INFO, history[:1]), cache.embed("¿cómo vendo más?")) is None
+
+
+if __name__ == "__main__":
+    print("🧪 Ejecutando pruebas del estado entre turnos...")
+    for test in (test_turn_input_keeps_checkpointed_state,
+                 test_reset_thread_clears_state,
+                 test_supervisor_update_does_not_depend_on_log_level,
+                 test_trivial_replies_share_one_definition,
+                 test_semantic_cache_is_partitioned_by_business_and_history):
+        test()
+        print(f"✅ {test.__name__}")